@@ -1,13 +1,14 @@
 import logging
 import os
-import time
 from datetime import datetime
 
 import click
 
 from drone.camera import CameraService
 from drone.mavlink_logging import MAVLinkHandler
+from drone.mavlink_router import MAVLinkRouter
 from drone.rc import RCService
+from drone.service_watch import watch_service
 
 # location of the Pixhawk6c serial port and baud rate for the connection.
 CONNECTION_STRING = "/dev/serial0"
@@ -21,6 +22,9 @@ MEDIA_FOLDER = "/srv/samba/share/"
 # VLC or any other player that supports UDP streams.
 VIDEO_STREAM_URL = "192.168.50.29:12345"
 
+# Service of the WFB link, the stream is started only while it's running
+WFB_SERVICE = "wifibroadcast@drone.service"
+
 # Set up logging
 logger = logging.getLogger("camera")
 logger.setLevel(logging.DEBUG)
@@ -61,18 +65,19 @@ def main(
     Main function to start the camera and RC services. It initializes the camera service and the RC service
     and listens for changes in the RC channels. It runs forever until the battery runs out.
     """
-    mavlink_handler = MAVLinkHandler(drone_connection, drone_baud_rate)
-    mavlink_handler.setLevel(logging.INFO)
-    logger.addHandler(mavlink_handler)
-
-    stream_resolution = tuple(map(int, stream_resolution.split("x")))
-    with CameraService(stream_url, media_folder, stream_resolution) as camera:
-        RCService(drone_connection, drone_baud_rate, camera).listen()
-
-        # Health check for the WFB service
-        while True:
-            camera.wfb_running = os.system("systemctl is-active --quiet wifibroadcast@drone") == 0
-            time.sleep(2)  # Run forever (realistically, until the battery runs out)
+    # The router is the only reader and writer of the flight controller port, the others attach to it
+    with MAVLinkRouter(drone_connection, drone_baud_rate) as router:
+        mavlink_handler = MAVLinkHandler(router)
+        mavlink_handler.setLevel(logging.INFO)
+        logger.addHandler(mavlink_handler)
+
+        stream_resolution = tuple(map(int, stream_resolution.split("x")))
+        with CameraService(stream_url, media_folder, stream_resolution) as camera:
+            RCService(router.udp_endpoint(), drone_baud_rate, camera).listen()
+
+            # Health check for the WFB service, updated as soon as systemd reports a start or a stop.
+            # Runs forever (realistically, until the battery runs out)
+            watch_service(WFB_SERVICE, lambda running: setattr(camera, "wfb_running", running))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,131 @@
+"""
+Stand-ins for the services and the flight controller of the drone, so the drone code can be run without the board.
+"""
+import os
+import queue
+import select
+import threading
+import time
+import tty
+
+from pymavlink.dialects.v20 import ardupilotmega as mavlink2
+
+from drone.service_watch import SystemdBus, UNIT_INTERFACE, unit_object_path
+
+
+class FakeSystemdBus(SystemdBus):
+    """
+    In-memory systemd for the service watchers. set_state() changes the state of a unit and signals it
+    to the subscribers, like systemd does on a start or a stop.
+    """
+
+    def __init__(self, states: dict[str, str] = None):
+        """
+        :param states: initial ActiveState of the units by name, the rest are "inactive"
+        """
+        self._states = {unit_object_path(unit): state for unit, state in (states or {}).items()}
+        self._subscribed = set()
+        self._changes = queue.Queue()
+        self.calls = 0  # Method calls made over the bus
+
+    def load_unit(self, unit: str) -> str:
+        self.calls += 1
+        return unit_object_path(unit)
+
+    def subscribe(self, path: str):
+        self.calls += 1
+        self._subscribed.add(path)
+
+    def active_state(self, path: str) -> str:
+        self.calls += 1
+        return self._states.get(path, "inactive")
+
+    def receive(self) -> tuple[str, str, dict, list]:
+        change = self._changes.get()
+        if change is None:
+            raise ConnectionResetError("Fake bus closed")
+        return change
+
+    def set_state(self, unit: str, state: str, sub_state: str = "running"):
+        """
+        Change the ActiveState of the unit and signal it with its SubState
+        """
+        path = unit_object_path(unit)
+        self._states[path] = state
+        if path in self._subscribed:
+            self._changes.put((path, UNIT_INTERFACE, {"ActiveState": state, "SubState": sub_state}, []))
+
+    def close(self):
+        """
+        Disconnect, the receive() waiting for a change raises like on a lost connection
+        """
+        self._changes.put(None)
+
+
+class FakeFlightController:
+    """
+    Flight controller stand-in on a pseudo terminal, for running the MAVLink router without the board. Open device
+    like the serial port of the flight controller. It sends a HEARTBEAT and an ATTITUDE at the rate, answers
+    the parameter list requests like the SITL does and decodes everything written to it.
+    """
+    PARAMETERS = {"SYSID_THISMAV": 1.0, "BATT_CAPACITY": 5200.0}  # Sent on PARAM_REQUEST_LIST, enough for dronekit
+
+    def __init__(self, rate: float = 10):
+        """
+        :param rate: telemetry messages per second
+        """
+        self.rate = rate
+        self.armed = False
+        self.received = []  # Messages written to the flight controller
+        self.device = None
+        self._fd = None
+        self._device_fd = None
+        self._mav = mavlink2.MAVLink(None, srcSystem=1, srcComponent=1)
+        self._thread = None
+        self._running = False
+
+    def __enter__(self):
+        self._fd, self._device_fd = os.openpty()
+        tty.setraw(self._device_fd)  # No echo and no newline translation, like a serial port
+        self.device = os.ttyname(self._device_fd)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._running = False
+        self._thread.join()
+        os.close(self._fd)
+        os.close(self._device_fd)
+
+    def messages(self, msg_type: str) -> list:
+        return [message for message in self.received if message.get_type() == msg_type]
+
+    def _run(self):
+        next_send = time.monotonic()
+        while self._running:
+            if select.select([self._fd], [], [], max(0.0, next_send - time.monotonic()))[0]:
+                for byte in os.read(self._fd, 4096):
+                    message = self._mav.parse_char(bytes([byte]))
+                    if message is not None:
+                        self.received.append(message)
+                        if message.get_type() == "PARAM_REQUEST_LIST":
+                            self._send_parameters()
+            if time.monotonic() >= next_send:
+                base_mode = mavlink2.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED
+                if self.armed:
+                    base_mode |= mavlink2.MAV_MODE_FLAG_SAFETY_ARMED
+                heartbeat = self._mav.heartbeat_encode(mavlink2.MAV_TYPE_QUADROTOR,
+                                                       mavlink2.MAV_AUTOPILOT_ARDUPILOTMEGA, base_mode, 0,
+                                                       mavlink2.MAV_STATE_STANDBY)
+                boot_ms = int(time.monotonic() * 1000) % 2 ** 32
+                attitude = self._mav.attitude_encode(boot_ms, 0.01, -0.02, 1.57, 0, 0, 0)
+                os.write(self._fd, heartbeat.pack(self._mav) + attitude.pack(self._mav))
+                next_send += 1 / self.rate
+
+    def _send_parameters(self):
+        for index, (name, value) in enumerate(self.PARAMETERS.items()):
+            message = self._mav.param_value_encode(name.encode(), value, mavlink2.MAV_PARAM_TYPE_REAL32,
+                                                   len(self.PARAMETERS), index)
+            os.write(self._fd, message.pack(self._mav))
@@ -2,6 +2,9 @@ import logging
 
 from pymavlink import mavutil
 
+from drone import mavlink_router
+from drone.mavlink_router import MAVLinkRouter
+
 
 class MAVLinkHandler(logging.Handler):
     """
@@ -15,9 +18,14 @@ class MAVLinkHandler(logging.Handler):
         logging.CRITICAL: mavutil.mavlink.MAV_SEVERITY_CRITICAL,
     }
 
-    def __init__(self, connection_string: str, baud_rate: int):
+    def __init__(self, router: MAVLinkRouter):
+        """
+        :param router: router of the flight controller link, the messages are sent with the lowest priority
+        """
         super().__init__()
-        self.master = mavutil.mavlink_connection(connection_string, baud=baud_rate, source_system=1)
+        self.router = router
+        # The router's own records are never sent over the link they report on
+        self.addFilter(lambda record: record.name != mavlink_router.logger.name)
 
     def emit(self, record):
         """
@@ -27,4 +35,4 @@ class MAVLinkHandler(logging.Handler):
         """
         log_entry = "CAMERA: " + self.format(record)
         severity = self.MAVLINK_STATUSTEXT_SEVERITY.get(record.levelno, mavutil.mavlink.MAV_SEVERITY_INFO)
-        self.master.mav.statustext_send(severity, log_entry.encode())
+        self.router.send(self.router.mav.statustext_encode(severity, log_entry.encode()), MAVLinkRouter.PRIORITY_LOG)
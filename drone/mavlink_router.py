@@ -0,0 +1,221 @@
+import itertools
+import logging
+import math
+import queue
+import socket
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Iterable
+
+from pymavlink import mavutil
+
+# Child of the camera logger, so the records reach its console and files. MAVLinkHandler drops them: a failing link
+# would otherwise log an error, which queues a STATUSTEXT that fails and logs again
+logger = logging.getLogger("camera.mavlink")
+
+
+class MAVLinkRouter:
+    """
+    Single owner of the flight controller link. One thread reads and decodes the messages once and fans them out to the
+    subscribers of their message ids, one thread writes the outgoing messages from a priority queue, so nothing else
+    reads or writes the serial port. Consumers that need a MAVLink connection of their own, like dronekit, attach to
+    a local UDP endpoint that gets every message of the flight controller.
+    """
+    # Priorities of the outgoing messages, the lower ones are written first
+    PRIORITY_CONTROL = 0  # Commands and parameter requests, e.g. from dronekit
+    PRIORITY_TELEMETRY = 1
+    PRIORITY_LOG = 2  # STATUSTEXT log messages, dropped first if the link can't keep up
+    MAX_QUEUE = 256  # Outgoing messages waiting for the link
+    READ_TIMEOUT = .5  # Seconds the reader waits for a message before checking if it should stop
+    RETRY_INTERVAL = .5  # Seconds the reader and the writer wait after a failed read or write
+
+    def __init__(self, connection_string: str, baud_rate: int, source_system: int = 1):
+        """
+        :param connection_string: connection string of the flight controller, e.g. "/dev/serial0" or a UDP address
+        :param baud_rate: baud rate of the serial port
+        :param source_system: MAVLink system id of the messages sent by the router
+        """
+        self.connection_string = connection_string
+        self.baud_rate = baud_rate
+        self.source_system = source_system
+        self.master = None
+        self._subscribers = defaultdict(list)  # Callbacks by message id, None for all the messages
+        self._lock = threading.Lock()  # Guards the subscribers
+        self._outgoing = queue.PriorityQueue(maxsize=self.MAX_QUEUE)
+        self._sequence = itertools.count()  # Keeps the messages of the same priority in order
+        self._threads = []
+        self._endpoints = []
+        self._running = False
+        self.received = 0  # Messages received from the flight controller
+        self.sent = 0  # Messages written to the flight controller
+        self.dropped = 0  # Outgoing messages dropped because the queue was full or the write failed
+
+    def __enter__(self):
+        self.master = mavutil.mavlink_connection(self.connection_string, baud=self.baud_rate,
+                                                 source_system=self.source_system)
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._read, name="mavlink-read", daemon=True),
+            threading.Thread(target=self._write, name="mavlink-write", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"MAVLink router connected to {self.connection_string}")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._running = False
+        self._outgoing.put((math.inf, 0, None))  # Stops the writer after the queued messages are written
+        for thread in self._threads:
+            thread.join()
+        for endpoint in self._endpoints:
+            endpoint.close()
+        self.master.close()
+        logger.info(f"MAVLink router closed. Messages: {self.received} received, {self.sent} sent, "
+                    f"{self.dropped} dropped")
+
+    @property
+    def mav(self):
+        """
+        MAVLink encoder of the router, to build the messages to send, e.g. router.mav.statustext_encode(...)
+        """
+        return self.master.mav
+
+    def subscribe(self, callback: Callable, msg_ids: Iterable[int] = None) -> Callable[[], None]:
+        """
+        Call the callback with every received message of the ids, on the reader thread. It must not block.
+
+        :param callback: called with the decoded message
+        :param msg_ids: MAVLink message ids, e.g. mavutil.mavlink.MAVLINK_MSG_ID_HEARTBEAT. None for all the messages
+        :return: function to unsubscribe
+        """
+        keys = [None] if msg_ids is None else list(msg_ids)
+        with self._lock:
+            for key in keys:
+                self._subscribers[key] = [*self._subscribers[key], callback]
+
+        def unsubscribe():
+            with self._lock:
+                for key in keys:
+                    self._subscribers[key] = [c for c in self._subscribers[key] if c is not callback]
+
+        return unsubscribe
+
+    def send(self, message, priority: int = PRIORITY_TELEMETRY):
+        """
+        Queue the message for the flight controller. Messages are packed with the sequence number of the router
+        when they're written, frames are written as they are.
+
+        :param message: MAVLink message, or a packed frame
+        :param priority: one of the PRIORITY_* values
+        :return: False if the queue was full and the message was dropped
+        """
+        # The log messages may fill only half of the queue, so they never hold back the control messages
+        if priority >= self.PRIORITY_LOG and self._outgoing.qsize() >= self.MAX_QUEUE // 2:
+            self.dropped += 1
+            return False
+        try:
+            self._outgoing.put_nowait((priority, next(self._sequence), message))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def udp_endpoint(self, port: int = 14551) -> str:
+        """
+        Forward all the messages of the flight controller to a local UDP port and route the replies back,
+        for a consumer that opens its own MAVLink connection
+
+        :param port: local port the consumer listens on
+        :return: connection string for the consumer, e.g. for dronekit.connect
+        """
+        endpoint = _UDPEndpoint(self, ("127.0.0.1", port))
+        self._endpoints.append(endpoint)
+        return f"udpin:127.0.0.1:{port}"
+
+    def _read(self):
+        failures = 0
+        while self._running:
+            try:
+                message = self.master.recv_match(blocking=True, timeout=self.READ_TIMEOUT)
+            except OSError as e:
+                # Logged once per outage, a lost link fails on every try
+                if not failures:
+                    logger.error(f"MAVLink read failed: {e}")
+                failures += 1
+                time.sleep(self.RETRY_INTERVAL)
+                continue
+            if failures:
+                logger.warning(f"MAVLink read recovered, failed reads: {failures}")
+                failures = 0
+            if message is None or message.get_type() == "BAD_DATA":
+                continue
+            self.received += 1
+            # The lists are replaced, never modified, by subscribe, so they're read without the lock
+            subscribers = self._subscribers
+            for callback in (*subscribers.get(message.get_msgId(), ()), *subscribers.get(None, ())):
+                try:
+                    callback(message)
+                except Exception:
+                    logger.exception(f"MAVLink subscriber failed on {message.get_type()}")
+
+    def _write(self):
+        failures = 0
+        while True:
+            _, _, message = self._outgoing.get()
+            if message is None:
+                return
+            try:
+                self.master.write(message if isinstance(message, bytes) else message.pack(self.master.mav))
+            except OSError as e:
+                # Logged once per outage, the messages queued meanwhile would fail one after another
+                if not failures:
+                    logger.error(f"MAVLink write failed: {e}")
+                failures += 1
+                self.dropped += 1
+                if self._running:  # The messages left on close are dropped without waiting
+                    time.sleep(self.RETRY_INTERVAL)
+                continue
+            self.sent += 1
+            if failures:
+                logger.warning(f"MAVLink write recovered, messages lost: {failures}")
+                failures = 0
+
+
+class _UDPEndpoint:
+    """
+    Local UDP peer of the router. Sends the raw frames of the flight controller to the consumer port and queues the
+    frames the consumer sends back for the flight controller.
+    """
+
+    def __init__(self, router: MAVLinkRouter, address: tuple[str, int]):
+        self.router = router
+        self.address = address
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.settimeout(MAVLinkRouter.READ_TIMEOUT)
+        self._closed = False
+        self._unsubscribe = router.subscribe(self._forward)
+        self._thread = threading.Thread(target=self._receive, name="mavlink-udp", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._unsubscribe()
+        self._closed = True
+        self._thread.join()
+        self._socket.close()
+
+    def _forward(self, message):
+        try:
+            self._socket.sendto(message.get_msgbuf(), self.address)
+        except OSError:
+            pass  # The consumer isn't listening yet
+
+    def _receive(self):
+        while not self._closed:
+            try:
+                frames = self._socket.recv(65535)
+            except (TimeoutError, ConnectionRefusedError):
+                continue  # Refused: a frame was forwarded before the consumer started listening
+            self.router.send(bytes(frames), MAVLinkRouter.PRIORITY_CONTROL)
@@ -5,6 +5,7 @@ import dronekit
 
 from drone import buzzer
 from drone.camera import CameraService
+from health_check.flight_stats import write_armed
 
 logger = logging.getLogger("camera")
 
@@ -46,6 +47,7 @@ class RCService:
         """
         self._vehicle.add_attribute_listener("channels", self._channel_observer)
         self._vehicle.add_attribute_listener("armed", self._arm_observer)
+        self._publish_armed(self._vehicle.armed)
         logger.info("Listening for RC events")
         buzzer.rc_buzz()
         return self
@@ -87,6 +89,7 @@ class RCService:
         :param value: new value of the attribute
         """
         logger.debug(f"Vehicle armed: {value}")
+        self._publish_armed(value is True)
 
         if value is True:
             logger.info("Starting stream")
@@ -137,6 +140,18 @@ class RCService:
         else:
             logger.warning(f"Invalid RC value for video channel: {rc_value}")
 
+    @staticmethod
+    def _publish_armed(armed: bool) -> None:
+        """
+        Publish the arm state for the health check, which keeps the statistics of every flight
+
+        :param armed: the vehicle is armed
+        """
+        try:
+            write_armed(armed)
+        except OSError as e:
+            logger.error(f"Failed to publish the arm state: {e}")
+
     @staticmethod
     def _translate_rc_value(rc_value: int) -> RCValueEnum:
         """
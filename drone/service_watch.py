@@ -0,0 +1,261 @@
+import abc
+import logging
+import os
+import time
+from collections import deque
+from typing import Callable
+
+from health_check.cgroup import CGROUP_ROOT, unit_cgroup
+from health_check.sensors import SysfsFile
+
+logger = logging.getLogger("camera")
+
+SYSTEMD = "org.freedesktop.systemd1"
+MANAGER_PATH = "/org/freedesktop/systemd1"
+MANAGER_INTERFACE = "org.freedesktop.systemd1.Manager"
+UNIT_INTERFACE = "org.freedesktop.systemd1.Unit"
+# Unit states counted as running, the same as for systemctl is-active
+ACTIVE_STATES = frozenset(("active", "reloading"))
+# Seconds of cgroup polling before D-Bus is tried again after it failed, doubled on every failure up to the max
+DBUS_RETRY_MIN = 1
+DBUS_RETRY_MAX = 60
+
+
+def unit_object_path(unit: str) -> str:
+    """
+    D-Bus object path of the systemd unit, e.g. "/org/freedesktop/systemd1/unit/camera_2eservice"
+    """
+    escaped = "".join(c if c.isascii() and c.isalnum() else f"_{ord(c):02x}" for c in unit)
+    return f"{MANAGER_PATH}/unit/{escaped}"
+
+
+class SystemdBus(metaclass=abc.ABCMeta):
+    """
+    The part of the systemd D-Bus API needed to watch the state of the units. Errors of the bus are raised as OSError.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @abc.abstractmethod
+    def load_unit(self, unit: str) -> str:
+        """
+        :return: object path of the unit, the same for all the restarts of the unit
+        """
+
+    @abc.abstractmethod
+    def subscribe(self, path: str):
+        """
+        Start receiving the property changes of the unit
+        """
+
+    @abc.abstractmethod
+    def active_state(self, path: str) -> str:
+        """
+        :return: ActiveState of the unit, e.g. "active" or "inactive"
+        """
+
+    @abc.abstractmethod
+    def receive(self) -> tuple[str, str, dict, list]:
+        """
+        Wait for the next property change of a subscribed unit
+
+        :return: object path of the unit, interface, changed properties by name and names of the invalidated ones
+        """
+
+    def close(self):
+        pass
+
+
+class JeepneyBus(SystemdBus):
+    """
+    SystemdBus over the system bus with jeepney, a pure Python D-Bus client
+    """
+
+    def __init__(self, bus: str = "SYSTEM"):
+        """
+        :param bus: "SYSTEM", "SESSION" or the address of the bus
+        """
+        from jeepney import DBusAddress
+        from jeepney.io.blocking import open_dbus_connection
+
+        self._manager = DBusAddress(MANAGER_PATH, bus_name=SYSTEMD, interface=MANAGER_INTERFACE)
+        self._connection = open_dbus_connection(bus)
+        self._changes = deque()  # PropertiesChanged signals of the subscribed units, filled by the connection
+        self._subscribed = False
+
+    def load_unit(self, unit: str) -> str:
+        return self._call(self._manager, "LoadUnit", "s", (unit,))[0]
+
+    def subscribe(self, path: str):
+        from jeepney import MatchRule
+        from jeepney.bus_messages import message_bus
+
+        if not self._subscribed:
+            # systemd emits the unit signals only while some client is subscribed
+            self._call(self._manager, "Subscribe")
+            self._subscribed = True
+        signal = dict(type="signal", interface="org.freedesktop.DBus.Properties", member="PropertiesChanged", path=path)
+        # The bus resolves the well known name of systemd, but the signals carry its unique name,
+        # so only the rule sent to the bus is limited to the systemd sender
+        self._call(message_bus, "AddMatch", "s", (MatchRule(sender=SYSTEMD, **signal).serialise(),))
+        self._connection.filter(MatchRule(**signal), queue=self._changes)
+
+    def active_state(self, path: str) -> str:
+        from jeepney import DBusAddress, Properties
+
+        message = Properties(DBusAddress(path, bus_name=SYSTEMD, interface=UNIT_INTERFACE)).get("ActiveState")
+        return self._reply(message)[0][1]
+
+    def receive(self) -> tuple[str, str, dict, list]:
+        from jeepney import HeaderFields
+
+        message = self._connection.recv_until_filtered(self._changes)
+        interface, changed, invalidated = message.body
+        # The values are variants, (signature, value) pairs
+        changed = {name: value for name, (_, value) in changed.items()}
+        return message.header.fields[HeaderFields.path], interface, changed, invalidated
+
+    def close(self):
+        self._connection.close()
+
+    def _call(self, address, method: str, signature: str = None, body: tuple = ()) -> tuple:
+        from jeepney import new_method_call
+
+        return self._reply(new_method_call(address, method, signature, body))
+
+    def _reply(self, message) -> tuple:
+        from jeepney.wrappers import DBusErrorResponse, unwrap_msg
+
+        try:
+            return unwrap_msg(self._connection.send_and_get_reply(message))
+        except DBusErrorResponse as e:
+            raise OSError(f"D-Bus call failed: {e}") from e
+
+
+class ServiceWatcher(metaclass=abc.ABCMeta):
+    """
+    Watches whether a systemd service is running and calls back with the new state on every change
+    """
+
+    def __init__(self, unit: str, callback: Callable[[bool], None]):
+        """
+        :param unit: systemd unit name, e.g. "wifibroadcast@drone.service"
+        :param callback: called with True when the service starts running and with False when it stops
+        """
+        self.unit = unit
+        self.callback = callback
+        self.running = None  # Last known state, None until the first check
+
+    @abc.abstractmethod
+    def run(self):
+        """
+        Report the current state, then every change until the watch fails
+        """
+
+    def _update(self, running: bool):
+        if running != self.running:
+            self.running = running
+            self.callback(running)
+
+
+class DBusServiceWatcher(ServiceWatcher):
+    """
+    Receives the state changes of the unit as systemd signals them, so a stopped service is noticed
+    within milliseconds without starting any process
+    """
+
+    def __init__(self, unit: str, callback: Callable[[bool], None], bus: SystemdBus):
+        """
+        :param bus: connection to systemd, e.g. JeepneyBus or a FakeSystemdBus
+        """
+        super().__init__(unit, callback)
+        self.bus = bus
+
+    def run(self):
+        """
+        :raises OSError: if the bus fails
+        """
+        path = self.bus.load_unit(self.unit)
+        # Subscribed before reading the state, so no change between the two is missed
+        self.bus.subscribe(path)
+        self._update(self.bus.active_state(path) in ACTIVE_STATES)
+        while True:
+            changed_path, interface, changed, invalidated = self.bus.receive()
+            if changed_path != path or interface != UNIT_INTERFACE:
+                continue
+            if "ActiveState" in changed:
+                self._update(changed["ActiveState"] in ACTIVE_STATES)
+            elif "ActiveState" in invalidated:
+                self._update(self.bus.active_state(path) in ACTIVE_STATES)
+
+
+class CgroupServiceWatcher(ServiceWatcher):
+    """
+    Polls the cgroup of the service, which has processes only while the service is running. Reading it costs a single
+    syscall, but a change is noticed only on the next poll.
+    """
+    POLL_INTERVAL = .2  # Seconds between the checks
+
+    def __init__(self, unit: str, callback: Callable[[bool], None], root: str = CGROUP_ROOT):
+        """
+        :param root: cgroup v2 mount point, a fake tree can be used to run it off the board
+        """
+        super().__init__(unit, callback)
+        # "populated 1" while any process of the service is alive. The cgroup is removed when the service stops
+        self._events = SysfsFile(os.path.join(root, unit_cgroup(unit), "cgroup.events"))
+
+    def run(self, duration: float = None):
+        """
+        :param duration: seconds to poll for, forever if None
+        """
+        end = None if duration is None else time.monotonic() + duration
+        while end is None or time.monotonic() < end:
+            try:
+                running = "populated 1" in self._events.read().splitlines()
+            except OSError:
+                running = False
+            if not running:
+                self._events.close()  # A restart creates a new cgroup, the file is reopened on the next poll
+            self._update(running)
+            time.sleep(self.POLL_INTERVAL)
+
+
+def watch_service(unit: str, callback: Callable[[bool], None], bus_factory: Callable[[], SystemdBus] = JeepneyBus,
+                  root: str = CGROUP_ROOT):
+    """
+    Watch the service forever over D-Bus. While D-Bus isn't available, e.g. the bus is restarting, the cgroup of
+    the service is polled instead and D-Bus is tried again with an exponential backoff. If jeepney isn't installed,
+    the cgroup is polled for good.
+
+    :param unit: systemd unit name
+    :param callback: called with the running state of the service on every change
+    :param bus_factory: creates the connection to systemd
+    :param root: cgroup v2 mount point for the fallback
+    """
+    fallback = CgroupServiceWatcher(unit, callback, root)
+    retry = DBUS_RETRY_MIN
+    while True:
+        connected_at = time.monotonic()
+        try:
+            with bus_factory() as bus:
+                logger.info(f"Watching {unit} over D-Bus")
+                watcher = DBusServiceWatcher(unit, callback, bus)
+                # The last known state is carried over, so switching the watchers doesn't repeat the callback
+                watcher.running = fallback.running
+                try:
+                    watcher.run()
+                finally:
+                    fallback.running = watcher.running
+        except ImportError as e:
+            logger.warning(f"Can't watch {unit} over D-Bus, polling its cgroup instead: {e}")
+            fallback.run()
+        except OSError as e:
+            if time.monotonic() - connected_at > DBUS_RETRY_MAX:
+                retry = DBUS_RETRY_MIN  # The watch worked for a while, e.g. the bus was restarted
+            logger.warning(f"Can't watch {unit} over D-Bus, polling its cgroup for {retry} s: {e}")
+            fallback.run(retry)
+            retry = min(retry * 2, DBUS_RETRY_MAX)
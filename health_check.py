@@ -1,47 +1,78 @@
+import logging
 import os
-import time
-from datetime import datetime
+import signal
+import sys
 
-from health_check.collector import log_health
+import click
+
+from health_check.collector import COLLECTORS, file_columns, health_record
+from health_check.flight_stats import FlightStats, save_summary
+from health_check.log_writer import HealthLogWriter
 from health_check.mavlink_logger import MAVLinkLogger
+from health_check.scheduler import SampleScheduler
+
+logger = logging.getLogger("health_check")
 
 log_directory = "/var/log/health_check"
 shared_directory = "/srv/samba/share/logs/health_check"
-os.makedirs(log_directory, exist_ok=True)
-os.makedirs(shared_directory, exist_ok=True)
-filename = f"health_check_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-
-file_columns = (
-    "datetime",
-    "cpu_percent",
-    "memory_percent",
-    "camera_cpu_percent",
-    "camera_memory",
-    "wfb_cpu_percent",
-    "wfb_memory",
-    "temperature",
-    "cpu_clock",
-    "cpu_voltage",
-    "under_voltage",
-    "arm_freq_capped",
-    "throttled",
-    "soft_temp_limit",
-)
+flight_stats_file = os.path.join(shared_directory, "flight_stats.jsonl")
+
+SAMPLE_INTERVAL = .2  # Seconds between the health records, the collectors have their own rates
+# Columns of the flight statistics, every column of the record except the time and the arm state
+STATS_COLUMNS = tuple(column for column in file_columns[1:] if column != "armed")
+
+
+@click.command()
+@click.option("--telemetry-rate", default=1.0, type=click.FloatRange(0, 5, min_open=True),
+              help="Health records sent to the GCS per second, at most 5")
+@click.option("--flight-stats-interval", default=10.0, type=click.FloatRange(min=0),
+              help="Seconds between the flight statistics sent to the GCS while armed, 0 to send them only at disarm")
+def main(telemetry_rate: float, flight_stats_interval: float):
+    # Send every Nth sample to the GCS
+    telemetry_every = max(1, round(1 / (telemetry_rate * SAMPLE_INTERVAL)))
+
+    # Stopping the service closes the log, so the buffered records are written and the last segment is published
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    # The statistics of the current or the last flight are sent on demand with: systemctl kill -s USR1 health_check
+    requested = []
+    signal.signal(signal.SIGUSR1, lambda *_: requested.append(True))
+
+    flight_stats = FlightStats(STATS_COLUMNS)
+    sent_at = 0.0
+    with (HealthLogWriter(log_directory, shared_directory, file_columns) as log_writer,
+          MAVLinkLogger() as mav_logger,
+          SampleScheduler(COLLECTORS, SAMPLE_INTERVAL) as scheduler):
+        for counter, sample in enumerate(scheduler.records()):
+            data = health_record(sample.timestamp, sample.values, sample.lag)
+            # Append the data to the csv file, the closed segments are published to the shared directory
+            log_writer.write(data)
+            if counter % telemetry_every == 0:
+                mav_logger.log(sample.timestamp, data)
+
+            armed = sample.values.get("armed", False)
+            if armed and not flight_stats.armed:
+                # Every flight gets a log segment of its own
+                log_writer.rotate()
+                flight_stats.arm(sample.timestamp)
+            elif not armed and flight_stats.armed:
+                # Closed at the landing, so the flight is published even if the battery is pulled right after
+                log_writer.rotate()
+                flight_stats.disarm(sample.timestamp)
+                try:
+                    save_summary(flight_stats.summary(), flight_stats_file)
+                except OSError as e:
+                    logger.error(f"Failed to save the flight statistics: {e}")
+                requested.append(True)
+            if flight_stats.armed:
+                flight_stats.add(sample.timestamp, dict(zip(file_columns, data)))
+                if flight_stats_interval and sample.timestamp - sent_at >= flight_stats_interval:
+                    requested.append(True)
+
+            if requested and (summary := flight_stats.summary()) is not None:
+                mav_logger.log_flight_stats(summary)
+                sent_at = sample.timestamp
+            requested.clear()
+
 
 if __name__ == "__main__":
-    counter = 0
-    with (open(os.path.join(log_directory, filename), "a") as file,
-          open(os.path.join(shared_directory, filename), "a") as shared_file,
-          MAVLinkLogger() as mav_logger):
-        file.write(",".join(file_columns) + "\n")
-        shared_file.write(",".join(file_columns) + "\n")
-        while True:
-            data = log_health()
-            # Append the data to the csv file
-            file.write(",".join(map(str, data)) + "\n")
-            shared_file.write(",".join(map(str, data)) + "\n")
-            # Log the data to the GCS every second
-            if counter % 5 == 0:
-                mav_logger.log(data)
-            time.sleep(.2)
-            counter += 1
+    main()
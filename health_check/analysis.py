@@ -0,0 +1,295 @@
+"""
+Offline analysis of the health logs, e.g. the ones published to the Samba share. Prints a summary of every flight
+and optionally plots them. A log is parsed once in chunks, memory-mapped if it's not compressed, and its columns
+are saved to a sidecar index next to it (<log>.npz), so the next runs load only the arrays.
+
+Run with: python -m health_check.analysis <log or directory>... [--plot DIR]
+"""
+import gzip
+import io
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, NamedTuple
+
+import click
+import numpy as np
+
+CHUNK_SIZE = 32 * 1024 ** 2  # Bytes of CSV parsed at once
+INDEX_VERSION = 1  # Bumped when the layout of the sidecar index changes
+FLIGHT_GAP = 60  # Seconds without records that split two flights
+PLOT_POINTS = 2000  # Points per plotted series, the samples are downsampled to their min/max envelope
+# Columns summarized as percentiles: the resource usage of the drone computer and of the services
+PERCENTILE_COLUMNS = (
+    "cpu_percent", "memory_percent", "camera_cpu_percent", "camera_memory", "wfb_cpu_percent", "wfb_memory",
+)
+PLOT_COLUMNS = ("temperature", "cpu_percent", "camera_cpu_percent", "wfb_cpu_percent")
+
+
+class HealthLog(NamedTuple):
+    timestamps: np.ndarray  # UNIX timestamps of the records, local time
+    columns: tuple[str, ...]  # Names of the value columns
+    values: np.ndarray  # float32 (records, columns), NaN if missing, 0/1 for the flags
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self.columns:
+            return np.full(len(self.timestamps), np.nan, dtype=np.float32)
+        return self.values[:, self.columns.index(name)]
+
+    def __getitem__(self, item) -> "HealthLog":
+        return HealthLog(self.timestamps[item], self.columns, self.values[item])
+
+
+def _iter_chunks(path: str) -> Iterator[bytes]:
+    """
+    Read the log in chunks that end at a line boundary. Uncompressed logs are memory-mapped,
+    so only the chunk being parsed is paged in.
+    """
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as file:
+            rest = b""
+            while chunk := file.read(CHUNK_SIZE):
+                chunk = rest + chunk
+                end = chunk.rfind(b"\n") + 1
+                rest = chunk[end:]
+                yield chunk[:end]
+            if rest:
+                yield rest
+        return
+
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            while start < len(data):
+                end = min(start + CHUNK_SIZE, len(data))
+                if end < len(data):
+                    end = data.rfind(b"\n", start, end) + 1 or end
+                yield data[start:end]
+                start = end
+
+
+def _parse_chunk(chunk: bytes, width: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    :return: timestamps and values of the records in the chunk
+    """
+    # The records are written with str(), so None, True and False are turned into numbers for the C parser.
+    # The logs from before the telemetry change have cpu_voltage with its unit, e.g. "1.2000V"
+    chunk = chunk.replace(b"None", b"nan").replace(b"True", b"1").replace(b"False", b"0")
+    chunk = chunk.replace(b"V,", b",").replace(b"V\n", b"\n")
+    # Lines of a segment cut by a power cut have fewer columns, they are dropped
+    lines = [line for line in chunk.split(b"\n") if line.count(b",") == width]
+    if not lines:
+        return np.empty(0), np.empty((0, width), dtype=np.float32)
+    data = io.BytesIO(b"\n".join(lines))
+    values = np.loadtxt(data, delimiter=",", usecols=range(1, width + 1), dtype=np.float32, ndmin=2)
+    data.seek(0)
+    dates = np.loadtxt(data, delimiter=",", usecols=0, dtype="U23", ndmin=1)
+    timestamps = dates.astype("datetime64[ms]").astype(np.int64) / 1000
+    return timestamps, values
+
+
+def parse_log(path: str) -> HealthLog:
+    """
+    Parse a health log CSV, plain or gzipped
+    """
+    chunks = _iter_chunks(path)
+    first = next(chunks, b"")
+    header, _, first = first.partition(b"\n")
+    columns = tuple(header.decode().strip().split(","))[1:]
+
+    timestamps, values = [], []
+    for chunk in (first, *chunks) if first else chunks:
+        chunk_timestamps, chunk_values = _parse_chunk(chunk, len(columns))
+        timestamps.append(chunk_timestamps)
+        values.append(chunk_values)
+    if not timestamps:
+        return HealthLog(np.empty(0), columns, np.empty((0, len(columns)), dtype=np.float32))
+    return HealthLog(np.concatenate(timestamps), columns, np.concatenate(values))
+
+
+def load_log(path: str, use_index: bool = True) -> HealthLog:
+    """
+    Load the log from its sidecar index, parse it and build the index if it's missing or outdated
+    """
+    index = f"{path}.npz"
+    stat = os.stat(path)
+    if use_index and os.path.exists(index):
+        with np.load(index) as data:
+            if (int(data["version"]) == INDEX_VERSION and int(data["size"]) == stat.st_size
+                    and int(data["mtime_ns"]) == stat.st_mtime_ns):
+                return HealthLog(data["timestamps"], tuple(data["columns"].tolist()), data["values"])
+
+    log = parse_log(path)
+    if use_index:
+        try:
+            with open(f"{index}.tmp", "wb") as file:
+                np.savez(file, version=INDEX_VERSION, size=stat.st_size, mtime_ns=stat.st_mtime_ns,
+                         timestamps=log.timestamps, columns=np.array(log.columns), values=log.values)
+            os.replace(f"{index}.tmp", index)
+        except OSError:
+            pass  # Read-only share, the log is parsed again next time
+    return log
+
+
+def find_logs(paths: tuple[str, ...]) -> list[str]:
+    """
+    Health logs in the paths, the directories are searched for health_check_*.csv(.gz)
+    """
+    logs = []
+    for path in paths:
+        if not os.path.isdir(path):
+            logs.append(path)
+            continue
+        for name in sorted(os.listdir(path)):
+            if name.startswith("health_check_") and name.endswith((".csv", ".csv.gz")):
+                logs.append(os.path.join(path, name))
+    return logs
+
+
+def merge_logs(logs: list[HealthLog]) -> HealthLog:
+    """
+    Merge the logs into one sorted by time, over the union of their columns
+    """
+    columns = tuple(dict.fromkeys(column for log in logs for column in log.columns))
+    timestamps = np.concatenate([log.timestamps for log in logs]) if logs else np.empty(0)
+    values = np.full((len(timestamps), len(columns)), np.nan, dtype=np.float32)
+    offset = 0
+    for log in logs:
+        for i, column in enumerate(log.columns):
+            values[offset:offset + len(log.timestamps), columns.index(column)] = log.values[:, i]
+        offset += len(log.timestamps)
+    order = np.argsort(timestamps, kind="stable")
+    return HealthLog(timestamps[order], columns, values[order])
+
+
+def split_flights(log: HealthLog, gap: float = FLIGHT_GAP) -> list[HealthLog]:
+    """
+    Split the records into flights at the arm and disarm, the ground time in between is left out. The records
+    without the armed column, from the logs before it was added, are split at the gaps of more than gap seconds
+    instead, e.g. the drone was powered off. A gap also ends an armed flight, if the battery was pulled while armed.
+    """
+    if not len(log.timestamps):
+        return []
+    armed = log.column("armed")
+    # 1 armed, 0 disarmed, -1 unknown
+    state = np.where(np.isnan(armed), -1, armed > 0).astype(np.int8)
+    bounds = np.flatnonzero((np.diff(log.timestamps) > gap) | (np.diff(state) != 0)) + 1
+    return [
+        log[start:end] for start, end in zip((0, *bounds), (*bounds, len(log.timestamps)))
+        if state[start] != 0
+    ]
+
+
+def summarize(flight: HealthLog) -> dict:
+    """
+    Summary of one flight: its time span, the max temperature, the time the CPU was throttled
+    and the percentiles of the resource usage
+    """
+    timestamps = flight.timestamps
+    # Each record stands for the time until the next one
+    durations = np.diff(timestamps, append=timestamps[-1])
+    throttled = np.nan_to_num(flight.column("throttled")) + np.nan_to_num(flight.column("arm_freq_capped")) > 0
+
+    summary = {
+        "start": timestamps[0],
+        "duration": timestamps[-1] - timestamps[0],
+        "records": len(timestamps),
+        "max_temperature": _nan_stat(np.nanmax, flight.column("temperature")),
+        "throttled_time": float(durations[throttled].sum()),
+    }
+    for column in PERCENTILE_COLUMNS:
+        values = flight.column(column)
+        for q in (50, 95):
+            summary[f"{column}_p{q}"] = _nan_stat(np.nanpercentile, values, q)
+        summary[f"{column}_max"] = _nan_stat(np.nanmax, values)
+    return summary
+
+
+def _nan_stat(stat, values: np.ndarray, *args) -> float | None:
+    if np.isnan(values).all():
+        return None
+    return float(stat(values, *args))
+
+
+def downsample(timestamps: np.ndarray, values: np.ndarray, points: int = PLOT_POINTS) -> tuple[np.ndarray, ...]:
+    """
+    Reduce the series to the min and max of points / 2 equal buckets, so the peaks stay visible
+
+    :return: timestamps of the buckets, min and max values
+    """
+    buckets = max(1, points // 2)
+    if len(values) <= buckets:
+        return timestamps, values, values
+    bounds = np.linspace(0, len(values), buckets + 1).astype(int)
+    # fmin and fmax skip the missing samples unless the whole bucket is missing
+    low = np.fmin.reduceat(values, bounds[:-1])
+    high = np.fmax.reduceat(values, bounds[:-1])
+    return timestamps[bounds[:-1]], low, high
+
+
+def plot_flight(flight: HealthLog, path: str):
+    """
+    Plot the temperature and the CPU usage over the flight to an image
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib import pyplot as plt
+
+    minutes = (flight.timestamps - flight.timestamps[0]) / 60
+    fig, axes = plt.subplots(len(PLOT_COLUMNS), 1, sharex=True, figsize=(10, 2 * len(PLOT_COLUMNS)))
+    for ax, column in zip(axes, PLOT_COLUMNS):
+        x, low, high = downsample(minutes, flight.column(column))
+        ax.fill_between(x, low, high, linewidth=0.5)
+        ax.set_ylabel(column)
+    axes[-1].set_xlabel("minutes")
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def _format(value, precision: int = 1) -> str:
+    return "-" if value is None else f"{value:.{precision}f}"
+
+
+@click.command()
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option("--gap", default=FLIGHT_GAP,
+              help="Seconds without records that split two flights, the only split of the logs without arm state")
+@click.option("--plot", "plot_directory", type=click.Path(file_okay=False),
+              help="Directory to save the plots to, needs matplotlib")
+@click.option("--no-index", is_flag=True, help="Parse the logs without reading or writing the sidecar index")
+@click.option("--jobs", default=os.cpu_count(), help="Logs parsed in parallel")
+def main(paths: tuple[str, ...], gap: float, plot_directory: str, no_index: bool, jobs: int):
+    logs = find_logs(paths)
+    parsed = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(load_log, path, not no_index) for path in logs]
+        for path, future in zip(logs, futures):
+            try:
+                parsed.append(future.result())
+            except (OSError, ValueError, EOFError) as e:
+                # A corrupt or foreign file is skipped, the other logs are still analysed
+                click.echo(f"Skipping {path}: {e}", err=True)
+    log = merge_logs(parsed)
+
+    flights = split_flights(log, gap)
+    click.echo(f"{len(parsed)} logs, {len(log.timestamps)} records, {len(flights)} flights")
+    click.echo(f"{'#':>3} {'start':<19} {'min':>6} {'max °C':>6} {'thr s':>6} {'cpu p95':>7} "
+               f"{'cam p50':>7} {'cam p95':>7} {'cam MB':>7} {'wfb p50':>7} {'wfb p95':>7} {'wfb MB':>7}")
+    for i, flight in enumerate(flights, 1):
+        s = summarize(flight)
+        start = np.datetime64(int(s["start"] * 1000), "ms").astype(str)[:19].replace("T", " ")
+        click.echo(f"{i:>3} {start:<19} {s['duration'] / 60:6.1f} {_format(s['max_temperature']):>6} "
+                   f"{s['throttled_time']:6.0f} {_format(s['cpu_percent_p95']):>7} "
+                   f"{_format(s['camera_cpu_percent_p50']):>7} {_format(s['camera_cpu_percent_p95']):>7} "
+                   f"{_format(s['camera_memory_max'], 0):>7} {_format(s['wfb_cpu_percent_p50']):>7} "
+                   f"{_format(s['wfb_cpu_percent_p95']):>7} {_format(s['wfb_memory_max'], 0):>7}")
+        if plot_directory:
+            os.makedirs(plot_directory, exist_ok=True)
+            plot_flight(flight, os.path.join(plot_directory, f"flight_{i:03}.png"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import time
+
+from health_check.sensors import SysfsFile
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def unit_cgroup(unit: str) -> str:
+    """
+    Path of the systemd system service cgroup relative to the cgroup v2 root. Instances of templated units live
+    in the slice of their template, e.g. "system.slice/system-wifibroadcast.slice/wifibroadcast@drone.service"
+    """
+    if "@" not in unit:
+        return os.path.join("system.slice", unit)
+    prefix = unit.split("@", 1)[0].replace("-", "\\x2d")
+    return os.path.join("system.slice", f"system-{prefix}.slice", unit)
+
+
+class ServiceCgroup:
+    """
+    Resource usage of a whole systemd service, including all the processes it started, read from its cgroup v2
+    accounting files. The files are kept open between the samples and reopened if the service was restarted.
+    """
+
+    def __init__(self, unit: str, root: str = CGROUP_ROOT):
+        """
+        :param unit: systemd unit name, e.g. "camera.service"
+        :param root: cgroup v2 mount point, a fake tree can be used to run it off the board
+        """
+        self.unit = unit
+        self.path = os.path.join(root, unit_cgroup(unit))
+        self._cpu_stat = SysfsFile(os.path.join(self.path, "cpu.stat"))
+        self._memory = SysfsFile(os.path.join(self.path, "memory.current"))
+        self._io_stat = SysfsFile(os.path.join(self.path, "io.stat"))
+        self._last_cpu = None  # (time.monotonic(), usage_usec) of the last sample
+
+    def cpu_percent(self) -> float | None:
+        """
+        CPU used since the last call, in percent of one core like psutil.Process.cpu_percent.
+        None on the first call and while the service isn't running.
+        """
+        try:
+            stat = self._read_stat(self._cpu_stat)
+        except OSError:
+            self._last_cpu = None
+            return None
+
+        now, usage = time.monotonic(), stat["usage_usec"]
+        last, self._last_cpu = self._last_cpu, (now, usage)
+        # The usage restarts from zero with the new cgroup of a restarted service
+        if last is None or usage < last[1] or now <= last[0]:
+            return None
+        return round((usage - last[1]) / 1000 ** 2 / (now - last[0]) * 100, 1)
+
+    def memory(self) -> float | None:
+        """
+        Memory charged to the service in MB, including the page cache. None while the service isn't running.
+        """
+        try:
+            return int(self._memory.read()) / 1024 ** 2
+        except (OSError, ValueError):
+            return None
+
+    def io(self) -> tuple[float | None, float | None]:
+        """
+        Bytes read and written by the service since it started, over all the block devices, in MB
+        """
+        try:
+            lines = self._io_stat.read().splitlines()
+        except OSError:
+            return None, None
+
+        read = written = 0
+        for line in lines:
+            # "<major>:<minor> rbytes=N wbytes=N rios=N wios=N dbytes=N dios=N"
+            for field in line.split()[1:]:
+                key, _, value = field.partition("=")
+                if key == "rbytes":
+                    read += int(value)
+                elif key == "wbytes":
+                    written += int(value)
+        return read / 1024 ** 2, written / 1024 ** 2
+
+    def close(self):
+        self._cpu_stat.close()
+        self._memory.close()
+        self._io_stat.close()
+
+    @staticmethod
+    def _read_stat(file: SysfsFile) -> dict[str, int]:
+        return {key: int(value) for key, value in (line.split() for line in file.read().splitlines())}
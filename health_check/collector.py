@@ -1,69 +1,141 @@
-import os
+import time
 from datetime import datetime
 
 import psutil
 
+from health_check.cgroup import ServiceCgroup
 from health_check.cpu_throttle import check_if_throttled
+from health_check.flight_stats import read_armed
+from health_check.scheduler import Collector
+from health_check.sensors import SensorReader
 
-PIDS = {
-    "camera": None,
-    "wifibroadcast@drone": None,
+# Columns of the health record returned by log_health
+file_columns = (
+    "datetime",
+    "cpu_percent",
+    "memory_percent",
+    "camera_cpu_percent",
+    "camera_memory",
+    "wfb_cpu_percent",
+    "wfb_memory",
+    "temperature",
+    "cpu_clock",
+    "cpu_voltage",
+    "under_voltage",
+    "arm_freq_capped",
+    "throttled",
+    "soft_temp_limit",
+    "under_voltage_occurred",
+    "arm_freq_capped_occurred",
+    "throttled_occurred",
+    "soft_temp_limit_occurred",
+    "camera_io_read",
+    "camera_io_write",
+    "wfb_io_read",
+    "wfb_io_write",
+    "armed",
+    "sample_lag_ms",
+)
+
+# Sensors are read from sysfs and the firmware mailbox, the files are opened on the first sample
+SENSORS = SensorReader()
+
+# Accounting of the services from their cgroups, restart-proof and including the child processes
+SERVICES = {
+    "camera": ServiceCgroup("camera.service"),
+    "wifibroadcast@drone": ServiceCgroup("wifibroadcast@drone.service"),
 }
 
 
-def log_health() -> tuple:
+def collect_cpu() -> dict:
+    return {"cpu_percent": psutil.cpu_percent()}
+
+
+def collect_memory() -> dict:
+    return {"memory_percent": psutil.virtual_memory().percent}
+
+
+def collect_temperature() -> dict:
+    return {"temperature": SENSORS.temperature()}
+
+
+def collect_cpu_clock() -> dict:
+    return {"cpu_clock": SENSORS.cpu_clock()}
+
+
+def collect_voltage() -> dict:
+    return {"cpu_voltage": SENSORS.core_voltage()}
+
+
+def collect_throttle() -> dict:
+    return dict(zip(file_columns[10:18], check_if_throttled(SENSORS)))
+
+
+def collect_armed() -> dict:
+    return {"armed": read_armed()}
+
+
+def collect_services() -> dict:
     """
-    Log the CPU and memory usage and temperature to the log file
+    Check how many resources the camera.service and the wifibroadcast.service are using
     """
-    cpu_percent = psutil.cpu_percent()
-    memory_percent = psutil.virtual_memory().percent
-    temperature = psutil.sensors_temperatures().get("cpu_thermal")
-    temperature = temperature[0].current if temperature else None
-    cpu_clock = psutil.cpu_freq().current / 1000
-    cpu_voltage = os.popen("vcgencmd measure_volts core").read().strip().split("=")[1]
+    values = dict()
+    for prefix, service in (("camera", "camera"), ("wfb", "wifibroadcast@drone")):
+        cpu_percent, memory, io_read, io_write = _check_service(service)
+        values.update({
+            f"{prefix}_cpu_percent": cpu_percent,
+            f"{prefix}_memory": memory,
+            f"{prefix}_io_read": io_read,
+            f"{prefix}_io_write": io_write,
+        })
+    return values
+
 
-    # Check how many resources the camera.service is using
-    camera_cpu_percent, camera_memory = _check_pid("camera")
+# Collectors of the health record with their sampling intervals. The ones that may block on the firmware
+# or on many files run on the worker threads of the scheduler
+COLLECTORS = (
+    Collector("cpu", collect_cpu, .2),
+    Collector("memory", collect_memory, 1),
+    Collector("temperature", collect_temperature, .2),
+    Collector("cpu_clock", collect_cpu_clock, .2),
+    Collector("throttle", collect_throttle, .2),
+    Collector("armed", collect_armed, .2),
+    Collector("voltage", collect_voltage, 1, slow=True),
+    Collector("services", collect_services, 1, slow=True),
+)
 
-    # Check how many resources the wifibroadcast.service is using
-    wfb_cpu_percent, wfb_memory = _check_pid("wifibroadcast@drone")
 
+def health_record(timestamp: float, values: dict, lag: float = 0.0) -> tuple:
+    """
+    Build the health record from the sampled values
+    :param timestamp: UNIX timestamp of the sample, logged as the datetime column
+    :param values: sampled values by column name, the missing ones are None
+    :param lag: seconds the sample was taken after its deadline
+    :return: health record with the file_columns
+    """
     return (
-        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        cpu_percent,
-        memory_percent,
-        camera_cpu_percent,
-        camera_memory,
-        wfb_cpu_percent,
-        wfb_memory,
-        temperature,
-        cpu_clock,
-        cpu_voltage,
-        *check_if_throttled(),
+        datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+        *(values.get(column) for column in file_columns[1:-1]),
+        round(lag * 1000, 1),
     )
 
 
-def _check_pid(service: str) -> tuple:
+def log_health(timestamp: float = None) -> tuple:
+    """
+    Log the CPU and memory usage and temperature to the log file, running all the collectors at once
+    :param timestamp: UNIX timestamp of the sample, logged as the datetime column. Default is now
+    :return: health record with the file_columns
+    """
+    values = dict()
+    for collector in COLLECTORS:
+        values.update(collector.collect())
+    return health_record(time.time() if timestamp is None else timestamp, values)
+
+
+def _check_service(service: str) -> tuple:
     """
-    Check if the process resource usage
+    Check the resource usage of the service and all its processes
+    :return: CPU percent, memory in MB, MB read and MB written since the service started
     """
-    cpu_percent, memory = None, None
-
-    global PIDS
-    if PIDS.get(service) is None:
-        pid = int(os.popen(f"systemctl show --property MainPID --value {service}.service").read().strip())
-        # If the service is not running
-        if pid == 0:
-            return cpu_percent, memory
-        PIDS[service] = psutil.Process(pid)
-    try:
-        cpu_percent = PIDS[service].cpu_percent()
-        memory = PIDS[service].memory_info().rss / 1024 ** 2
-    except psutil.NoSuchProcess:
-        new_pid = int(os.popen(f"systemctl show --property MainPID --value {service}.service").read().strip())
-        if new_pid == 0:
-            return cpu_percent, memory
-        PIDS[service] = psutil.Process(new_pid)
-        cpu_percent, memory = _check_pid(service)
-
-    return cpu_percent, memory
+    cgroup = SERVICES[service]
+    return cgroup.cpu_percent(), cgroup.memory(), *cgroup.io()
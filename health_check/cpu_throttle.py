@@ -1,6 +1,7 @@
-import os
 from enum import StrEnum
 
+from health_check.sensors import SensorReader
+
 
 class ThrottleEnum(StrEnum):
     UNDER_VOLTAGE = "Under-voltage detected"
@@ -18,23 +19,28 @@ THROTTLE_MAP = {
     1: ThrottleEnum.ARM_FREQ_CAPPED,
     2: ThrottleEnum.THROTTLED,
     3: ThrottleEnum.SOFT_TEMP_LIMIT,
+    16: ThrottleEnum.UNDER_VOLTAGE_OCCURRED,
+    17: ThrottleEnum.ARM_FREQ_CAPPED_OCCURRED,
+    18: ThrottleEnum.THROTTLED_OCCURRED,
+    19: ThrottleEnum.SOFT_TEMP_LIMIT_OCCURRED,
 }
 
 
-def check_if_throttled() -> list[bool]:
+def decode_throttled(value: int) -> list[bool]:
+    """
+    Decode the get_throttled bit mask, each bit represents a different type of throttling
+    :return: flag of every THROTTLE_MAP bit, in its order
+    """
+    return [bool(value >> bit & 1) for bit in THROTTLE_MAP]
+
+
+def check_if_throttled(sensors: SensorReader) -> list[bool]:
     """
-    Check if the CPU is throttled. Check the value of the get_throttled command and return the result
-    based on the value. The value is a bit mask where each bit represents a different type of throttling.
-    :return: List of reasons for throttling or None if the CPU is not throttled
+    Check if the CPU is throttled now or has been throttled since the boot
+    :param sensors: reader of the get_throttled value
+    :return: flag of every THROTTLE_MAP bit, in its order, None for all of them if the value can't be read
     """
-    res = os.popen("vcgencmd get_throttled").read().strip()
-    res = int(res[res.index("=") + 1:], 0)
-    # Should have at least 4 bits
-    res_binary = bin(res)[2:]
-    res_binary = "0" * (4 - len(res_binary)) + res_binary
-
-    reasons = []
-    for bit_n in THROTTLE_MAP.keys():
-        bit = res_binary[-bit_n - 1]
-        reasons.append(bool(int(bit)))
-    return reasons
+    value = sensors.throttled()
+    if value is None:
+        return [None] * len(THROTTLE_MAP)
+    return decode_throttled(value)
@@ -0,0 +1,208 @@
+import bisect
+import json
+import math
+import os
+from typing import NamedTuple
+
+# Arm state of the vehicle, "1" while armed, written by drone.rc.RCService. /run is a tmpfs, so it never wears
+# the SD card and a stale state doesn't survive a reboot
+ARMED_FILE = "/run/drone/armed"
+
+
+class P2Quantile:
+    """
+    Streaming estimate of one quantile with the P² algorithm (Jain and Chlamtac, 1985). Keeps five markers whose
+    heights are adjusted with a piecewise-parabolic interpolation, so the memory and the time per value are constant
+    no matter how long the flight is. Exact until the fifth value.
+    """
+
+    def __init__(self, q: float):
+        """
+        :param q: quantile to estimate, between 0 and 1
+        """
+        self.q = q
+        self._heights = []  # Marker heights, sorted
+        self._positions = [1, 2, 3, 4, 5]  # Actual positions of the markers
+        self._desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]  # Desired positions of the markers
+        self._increments = (0, q / 2, q, (1 + q) / 2, 1)  # Increments of the desired positions per value
+
+    def add(self, x: float):
+        heights, positions = self._heights, self._positions
+        if len(heights) < 5:
+            bisect.insort(heights, x)
+            return
+
+        # Cell of the new value, extending the extreme markers if it's outside of them
+        if x < heights[0]:
+            heights[0] = x
+            cell = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            cell = 3
+        else:
+            cell = bisect.bisect_right(heights, x) - 1
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Move the middle markers that are off their desired positions by one or more
+        for i in (1, 2, 3):
+            d = self._desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+                heights[i] = height
+                positions[i] += d
+
+    def _parabolic(self, i: int, d: int) -> float:
+        h, n = self._heights, self._positions
+        return h[i] + d / (n[i + 1] - n[i - 1]) * (
+                (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+                + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self) -> float | None:
+        """
+        Estimated quantile, None if no value was added
+        """
+        if not self._heights:
+            return None
+        if len(self._heights) < 5:
+            return self._heights[round(self.q * (len(self._heights) - 1))]
+        return self._heights[2]
+
+
+class ColumnSummary(NamedTuple):
+    count: int
+    minimum: float | None
+    maximum: float | None
+    mean: float | None
+    p50: float | None
+    p95: float | None
+    p99: float | None
+
+
+class RunningStats:
+    """
+    Min, max, mean and p50/p95/p99 of a stream of values in constant memory
+    """
+    QUANTILES = (.5, .95, .99)
+
+    def __init__(self):
+        self.count = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.mean = 0.0
+        self._quantiles = [P2Quantile(q) for q in self.QUANTILES]
+
+    def add(self, x: float):
+        self.count += 1
+        self.minimum = min(self.minimum, x)
+        self.maximum = max(self.maximum, x)
+        self.mean += (x - self.mean) / self.count
+        for quantile in self._quantiles:
+            quantile.add(x)
+
+    def summary(self) -> ColumnSummary:
+        if not self.count:
+            return ColumnSummary(0, None, None, None, None, None, None)
+        return ColumnSummary(self.count, self.minimum, self.maximum, self.mean,
+                             *(quantile.value() for quantile in self._quantiles))
+
+
+class FlightSummary(NamedTuple):
+    start: float  # UNIX timestamp of the arming
+    duration: float  # Seconds from the arming to the disarming, or to now if still armed
+    armed: bool  # The flight is still going on
+    columns: dict[str, ColumnSummary]  # Summary of every column, by name
+
+
+class FlightStats:
+    """
+    Running statistics of the health records of one arm/disarm session. Nothing is stored per record, so a summary
+    of the flight so far is available at any time without the log. The flags count as 0 and 1, so their mean
+    is the fraction of the flight they were set. Reset on every arming, the last flight is kept until the next one.
+    """
+
+    def __init__(self, columns: tuple[str, ...]):
+        """
+        :param columns: columns of the values to summarize
+        """
+        self.columns = columns
+        self.start = None  # UNIX timestamp of the arming, None before the first flight
+        self.end = None  # UNIX timestamp of the disarming, None while armed
+        self.last = None  # UNIX timestamp of the last record
+        self._stats = {column: RunningStats() for column in columns}
+
+    @property
+    def armed(self) -> bool:
+        return self.start is not None and self.end is None
+
+    def arm(self, timestamp: float):
+        """
+        Start a new flight, dropping the statistics of the last one
+        """
+        self.start, self.end, self.last = timestamp, None, timestamp
+        self._stats = {column: RunningStats() for column in self.columns}
+
+    def disarm(self, timestamp: float):
+        self.end = timestamp
+
+    def add(self, timestamp: float, values: dict):
+        """
+        Add the sampled values of one record, the missing ones are skipped
+
+        :param timestamp: UNIX timestamp of the record
+        :param values: sampled values by column name
+        """
+        self.last = timestamp
+        for column, stats in self._stats.items():
+            value = values.get(column)
+            if value is not None and not (isinstance(value, float) and math.isnan(value)):
+                stats.add(float(value))
+
+    def summary(self) -> FlightSummary | None:
+        """
+        Summary of the current flight, or of the last one if disarmed. None before the first flight
+        """
+        if self.start is None:
+            return None
+        end = self.last if self.end is None else self.end
+        return FlightSummary(self.start, end - self.start, self.armed,
+                             {column: stats.summary() for column, stats in self._stats.items()})
+
+
+def save_summary(summary: FlightSummary, path: str):
+    """
+    Append the flight summary to a JSON lines file, one line per flight
+    """
+    with open(path, "a") as file:
+        file.write(json.dumps({
+            "start": summary.start,
+            "duration": summary.duration,
+            "columns": {column: stats._asdict() for column, stats in summary.columns.items()},
+        }) + "\n")
+
+
+def read_armed(path: str = ARMED_FILE) -> bool:
+    """
+    Arm state of the vehicle, False if the RC service hasn't written it yet
+    """
+    try:
+        with open(path) as file:
+            return file.read().strip() == "1"
+    except OSError:
+        return False
+
+
+def write_armed(armed: bool, path: str = ARMED_FILE):
+    """
+    Publish the arm state of the vehicle for the other services. The file is replaced atomically,
+    so a reader never sees it empty
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w") as file:
+        file.write("1\n" if armed else "0\n")
+    os.replace(f"{path}.tmp", path)
@@ -0,0 +1,227 @@
+import errno
+import glob
+import gzip
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger("health_check")
+
+
+class HealthLogWriter:
+    """
+    CSV log of the health records, written in segments. The records are buffered in memory and written with one
+    write and fsync every FLUSH_INTERVAL seconds, so at most that much data is lost on a power cut. A segment is closed
+    once it reaches MAX_SEGMENT_BYTES or on rotate(), e.g. at the start of a flight. Closed segments are compressed
+    in a background thread and moved to the shared directory by an atomic rename, so the share never sees a partial
+    file and the SD card isn't written twice for every record. A share on another file system gets a copy renamed
+    into place instead. A failed publish is retried every PUBLISH_RETRY_INTERVAL seconds and again at the next start.
+    The oldest published segments left in the directory are removed once they take more than MAX_TOTAL_BYTES.
+    """
+    FLUSH_INTERVAL = 5  # Seconds between the writes to the SD card
+    MAX_BUFFER_BYTES = 64 * 1024  # Write earlier if the buffer grows over this
+    MAX_SEGMENT_BYTES = 16 * 1024 ** 2  # Segment size before the rotation, uncompressed
+    MAX_TOTAL_BYTES = 512 * 1024 ** 2  # Size of the compressed segments kept in the directory
+    PUBLISH_RETRY_INTERVAL = 60  # Seconds between the retries of the failed publishes
+    PREFIX = "health_check"
+
+    def __init__(self, directory: str, shared_directory: str | None, columns: tuple[str, ...]):
+        """
+        :param directory: directory of the segments, the open one is uncompressed
+        :param shared_directory: directory to publish the compressed closed segments to. None to not publish them
+        :param columns: CSV header of every segment
+        """
+        self.directory = directory
+        self.shared_directory = shared_directory
+        self.header = ",".join(columns) + "\n"
+        self._file = None
+        self._segment_bytes = 0
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._flushed_at = time.monotonic()
+        self._closed_segments = queue.Queue()
+        self._unpublished = []
+        self._thread = None
+
+    def __enter__(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if self.shared_directory:
+            os.makedirs(self.shared_directory, exist_ok=True)
+        # Temporary files of a compression or copy cut off by a power cut
+        for directory in filter(None, (self.directory, self.shared_directory)):
+            for path in glob.glob(os.path.join(directory, f"{self.PREFIX}_*.csv.gz.tmp")):
+                os.remove(path)
+        # Segments left open by a power cut are compressed and published first, then the ones whose publish failed
+        for path in sorted(glob.glob(os.path.join(self.directory, f"{self.PREFIX}_*.csv"))):
+            self._closed_segments.put(path)
+        self._unpublished = [path for path in self._compressed_segments() if not self._is_published(path)]
+        self._thread = threading.Thread(target=self._compress_segments, daemon=True)
+        self._thread.start()
+        self._open_segment()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._close_segment()
+        self._closed_segments.put(None)
+        self._thread.join()
+
+    def write(self, record: tuple):
+        """
+        Format the record as a CSV line and buffer it. The buffer is written if it's due.
+        """
+        line = ",".join(map(str, record)) + "\n"
+        self._buffer.append(line)
+        self._buffer_bytes += len(line)
+        if (self._buffer_bytes >= self.MAX_BUFFER_BYTES
+                or time.monotonic() - self._flushed_at >= self.FLUSH_INTERVAL):
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered records to the segment and make sure they reached the SD card
+        """
+        self._write_buffer()
+        if self._segment_bytes >= self.MAX_SEGMENT_BYTES:
+            self.rotate()
+
+    def rotate(self):
+        """
+        Close the current segment and start a new one
+        """
+        self._close_segment()
+        self._open_segment()
+
+    def _open_segment(self):
+        # The sequence number keeps the names unique if segments are rotated within a second
+        name = f"{self.PREFIX}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        path = os.path.join(self.directory, f"{name}.csv")
+        sequence = 1
+        while os.path.exists(path) or os.path.exists(f"{path}.gz"):
+            path = os.path.join(self.directory, f"{name}_{sequence}.csv")
+            sequence += 1
+        self._file = open(path, "w")
+        self._file.write(self.header)
+        self._segment_bytes = len(self.header)
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        self._write_buffer()
+        self._file.close()
+        self._closed_segments.put(self._file.name)
+        self._file = None
+
+    def _write_buffer(self):
+        if self._buffer:
+            data = "".join(self._buffer)
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._segment_bytes += len(data)
+            self._buffer.clear()
+            self._buffer_bytes = 0
+        self._flushed_at = time.monotonic()
+
+    def _compress_segments(self):
+        while True:
+            try:
+                path = self._closed_segments.get(timeout=self.PUBLISH_RETRY_INTERVAL if self._unpublished else None)
+            except queue.Empty:
+                path = ""
+            if path:
+                try:
+                    self._compress(path)
+                    self._unpublished.append(f"{path}.gz")
+                except OSError as e:
+                    logger.error(f"Failed to compress {path}: {e}")
+            self._publish_segments()
+            try:
+                self._prune_segments()
+            except OSError as e:
+                logger.error(f"Failed to prune the segments: {e}")
+            if path is None:
+                break
+
+    def _compress(self, path: str):
+        # The drone is powered off by pulling the battery, so every step is on the SD card before the next one:
+        # the data of the .gz before its rename, the rename before the removal of the segment
+        compressed = f"{path}.gz"
+        tmp = f"{compressed}.tmp"
+        with open(path, "rb") as src, open(tmp, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as dst:
+                shutil.copyfileobj(src, dst)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp, compressed)
+        _fsync_directory(self.directory)
+        os.remove(path)
+
+    def _publish_segments(self):
+        """
+        Publish the compressed segments waiting for it, the failed ones stay queued for the next retry
+        """
+        if not self.shared_directory:
+            self._unpublished.clear()
+            return
+        for path in list(self._unpublished):
+            try:
+                self._publish(path)
+                self._unpublished.remove(path)
+            except OSError as e:
+                logger.error(f"Failed to publish {path}: {e}")
+
+    def _publish(self, path: str):
+        shared = os.path.join(self.shared_directory, os.path.basename(path))
+        if os.stat(path).st_dev == os.stat(self.shared_directory).st_dev:
+            try:
+                # Same file system, the segment is moved without writing it again
+                os.replace(path, shared)
+                _fsync_directory(self.shared_directory)
+                _fsync_directory(self.directory)
+                return
+            except OSError as e:
+                # Different mounts of the same file system can't be renamed across
+                if e.errno != errno.EXDEV:
+                    raise
+        # Copied under a temporary name and renamed, so the share shows only complete segments
+        with open(path, "rb") as src, open(f"{shared}.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(f"{shared}.tmp", shared)
+        _fsync_directory(self.shared_directory)
+
+    def _prune_segments(self):
+        """
+        Remove the oldest published segments while the compressed ones take more than MAX_TOTAL_BYTES
+        """
+        segments = [(path, os.path.getsize(path)) for path in self._compressed_segments()]
+        total = sum(size for _, size in segments)
+        for path, size in segments:
+            if total <= self.MAX_TOTAL_BYTES:
+                break
+            if path not in self._unpublished:
+                os.remove(path)
+                total -= size
+
+    def _compressed_segments(self) -> list[str]:
+        # The names start with the time of the segment, so they sort from the oldest
+        return sorted(glob.glob(os.path.join(self.directory, f"{self.PREFIX}_*.csv.gz")))
+
+    def _is_published(self, path: str) -> bool:
+        return not self.shared_directory or os.path.exists(os.path.join(self.shared_directory, os.path.basename(path)))
+
+
+def _fsync_directory(directory: str):
+    """
+    Make the renames and removals in the directory durable
+    """
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
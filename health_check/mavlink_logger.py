@@ -1,7 +1,8 @@
-from datetime import datetime
-
 from pymavlink import mavutil
 
+from health_check import telemetry
+from health_check.flight_stats import FlightSummary
+
 
 class MAVLinkLogger:
     HOST = "127.0.0.1"
@@ -17,27 +18,19 @@ class MAVLinkLogger:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.master.close()
 
-    def log(self, data: tuple):
+    def log(self, timestamp: float, data: tuple):
+        """
+        Send the full health record of the RasbPI to the GCS as a binary DATA64 message, see health_check.telemetry
+        :param timestamp: UNIX timestamp of the sample
+        :param data: health record in the format of collector.file_columns
+        """
+        payload = telemetry.encode(timestamp, data)
+        self.master.mav.data64_send(telemetry.DATA_TYPE_HEALTH, len(payload), payload.ljust(64, b"\0"))
+
+    def log_flight_stats(self, summary: FlightSummary):
         """
-        Log the RasbPI data to the GCS via MAVLink messages. Pass only the data that is needed to be logged. Like
-        timestamp, temperature and if the CPU is throttled.
-        :param data: tuple of data to log in format (
-            "datetime",
-            "cpu_percent",
-            "memory_percent",
-            "camera_cpu_percent",
-            "camera_memory",
-            "wfb_cpu_percent",
-            "wfb_memory",
-            "temperature",
-            "cpu_clock",
-            "cpu_voltage",
-            "under_voltage",
-            "arm_freq_capped",
-            "throttled",
-            "soft_temp_limit"
-        )
+        Send the statistics of the flight to the GCS, one DATA64 message per column, see health_check.telemetry
+        :param summary: summary of the current or the last flight
         """
-        timestamp = datetime.strptime(data[0], "%Y-%m-%d %H:%M:%S").timestamp()
-        log_entry = f"{timestamp}, {data[7]}, {data[11]:b}"
-        self.master.mav.statustext_send(mavutil.mavlink.MAV_SEVERITY_INFO, log_entry.encode())
+        for payload in telemetry.encode_flight_stats(summary):
+            self.master.mav.data64_send(telemetry.DATA_TYPE_FLIGHT_STATS, len(payload), payload.ljust(64, b"\0"))
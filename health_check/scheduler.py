@@ -0,0 +1,108 @@
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, NamedTuple
+
+logger = logging.getLogger("health_check")
+
+
+class Collector(NamedTuple):
+    name: str
+    collect: Callable[[], dict]  # Returns the sampled values by column name
+    interval: float  # Seconds between the samples
+    slow: bool = False  # Run on a worker thread, so it never delays the other collectors
+
+
+class Sample(NamedTuple):
+    timestamp: float  # UNIX time the record was taken at
+    lag: float  # Seconds between the deadline of the record and the time it was taken
+    values: dict  # Latest value of every column sampled so far
+
+
+class SampleScheduler:
+    """
+    Runs every collector at its own rate on monotonic deadlines, so the sampling period doesn't drift with the cost
+    of the collectors. A deadline missed by more than one interval is skipped instead of sampling in a burst.
+    The slow collectors run on a thread pool, at most one sample of each at a time. A record of the latest values
+    of all the collectors is taken every record interval.
+    """
+
+    def __init__(self, collectors: tuple[Collector, ...], record_interval: float, workers: int = 2):
+        """
+        :param collectors: collectors to run
+        :param record_interval: seconds between the records
+        :param workers: threads for the slow collectors
+        """
+        self.collectors = collectors
+        self.record_interval = record_interval
+        self.workers = workers
+        self._values = dict()
+        self._lock = threading.Lock()  # Guards the values updated by the workers
+        self._running = dict()  # Future of every slow collector being sampled, by name
+        self._pool = None
+
+    def __enter__(self):
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="collector")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def records(self) -> Iterator[Sample]:
+        """
+        Sample the collectors forever and yield a record every record interval
+        """
+        start = time.monotonic()
+        deadlines = {collector.name: start for collector in self.collectors}
+        next_record = start
+
+        while True:
+            now = time.monotonic()
+            for collector in self.collectors:
+                if now >= deadlines[collector.name]:
+                    self._sample(collector)
+                    deadlines[collector.name] = self._next_deadline(deadlines[collector.name], collector.interval,
+                                                                    time.monotonic())
+
+            now = time.monotonic()
+            if now >= next_record:
+                with self._lock:
+                    values = dict(self._values)
+                yield Sample(time.time(), now - next_record, values)
+                next_record = self._next_deadline(next_record, self.record_interval, time.monotonic())
+
+            time.sleep(max(0.0, min(next_record, *deadlines.values()) - time.monotonic()))
+
+    def _sample(self, collector: Collector):
+        if not collector.slow:
+            self._update(self._collect(collector))
+            return
+
+        running = self._running.get(collector.name)
+        if running is not None and not running.done():
+            return  # The last sample is still running, this one is skipped
+        future = self._pool.submit(self._collect, collector)
+        future.add_done_callback(lambda f: f.cancelled() or self._update(f.result()))
+        self._running[collector.name] = future
+
+    @staticmethod
+    def _collect(collector: Collector) -> dict:
+        try:
+            return collector.collect()
+        except Exception as e:
+            logger.error(f"Collector {collector.name} failed: {e}")
+            return {}
+
+    def _update(self, values: dict):
+        with self._lock:
+            self._values.update(values)
+
+    @staticmethod
+    def _next_deadline(deadline: float, interval: float, now: float) -> float:
+        """
+        Next deadline on the interval grid, skipping the ones already missed
+        """
+        missed = max(0, math.floor((now - deadline) / interval))
+        return deadline + (missed + 1) * interval
@@ -0,0 +1,175 @@
+import fcntl
+import os
+import struct
+import threading
+from array import array
+
+
+class SysfsFile:
+    """
+    Sysfs attribute kept open between the reads. Every read regenerates the value with a pread from the start,
+    so sampling it costs a single syscall.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def read(self) -> str:
+        """
+        :raises OSError: if the attribute doesn't exist or can't be read
+        """
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDONLY)
+        try:
+            return os.pread(self._fd, 4096, 0).decode().strip()
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class Mailbox:
+    """
+    Property interface of the VideoCore firmware mailbox, the same one vcgencmd talks to, without starting a process.
+    The collectors run on several threads, so the requests and the descriptor are serialized by a lock.
+    """
+    IOCTL_PROPERTY = (3 << 30) | (struct.calcsize("P") << 16) | (100 << 8)  # _IOWR(100, 0, char *)
+    REQUEST = 0x00000000
+    RESPONSE_OK = 0x80000000
+
+    # Property tags, see https://github.com/raspberrypi/firmware/wiki/Mailbox-property-interface
+    GET_VOLTAGE = 0x00030003
+    GET_TEMPERATURE = 0x00030006
+    GET_THROTTLED = 0x00030046
+    VOLTAGE_CORE = 1
+
+    def __init__(self, path: str = "/dev/vcio"):
+        self.path = path
+        self._fd = None
+        self._lock = threading.Lock()
+
+    def property(self, tag: int, values: tuple[int, ...], size: int = None) -> tuple[int, ...]:
+        """
+        Send one property request and wait for the response
+
+        :param tag: property tag
+        :param values: request values, 32-bit each
+        :param size: number of 32-bit response values, if more than the request values
+        :return: response values
+        :raises OSError: if the mailbox isn't available or the firmware rejected the request
+        """
+        words = max(len(values), size or 0)
+        buffer = array("I", (0, self.REQUEST, tag, 4 * words, 0, *values, *[0] * (words - len(values)), 0))
+        buffer[0] = 4 * len(buffer)
+        with self._lock:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_RDWR)
+            try:
+                fcntl.ioctl(self._fd, self.IOCTL_PROPERTY, buffer, True)
+            except OSError:
+                self._close()
+                raise
+        if buffer[1] != self.RESPONSE_OK:
+            raise OSError(f"Mailbox request {tag:#010x} failed: {buffer[1]:#010x}")
+        return tuple(buffer[5:5 + words])
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SensorReader:
+    """
+    Raspberry Pi sensors read from sysfs and the firmware mailbox through persistent file descriptors.
+    vcgencmd is started only if neither of them is available.
+    """
+
+    def __init__(self, root: str = "/"):
+        """
+        :param root: root of the sysfs and /dev paths, a fake tree can be used to run the readers off the board
+        """
+        self._temperature = SysfsFile(os.path.join(root, "sys/class/thermal/thermal_zone0/temp"))
+        self._cpu_clock = SysfsFile(os.path.join(root, "sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq"))
+        self._throttled = SysfsFile(os.path.join(root, "sys/devices/platform/soc/soc:firmware/get_throttled"))
+        self._mailbox = Mailbox(os.path.join(root, "dev/vcio"))
+        self._vcgencmd_works = True  # Cleared once vcgencmd failed, so it isn't started again on every sample
+
+    def temperature(self) -> float | None:
+        """
+        SoC temperature in °C
+        """
+        try:
+            return int(self._temperature.read()) / 1000
+        except (OSError, ValueError):
+            pass
+        try:
+            return self._mailbox.property(Mailbox.GET_TEMPERATURE, (0,), size=2)[1] / 1000
+        except OSError:
+            return None
+
+    def cpu_clock(self) -> float | None:
+        """
+        Current clock of the first CPU core in GHz
+        """
+        try:
+            return int(self._cpu_clock.read()) / 1000 ** 2
+        except (OSError, ValueError):
+            return None
+
+    def core_voltage(self) -> float | None:
+        """
+        Core voltage in V
+        """
+        try:
+            return self._mailbox.property(Mailbox.GET_VOLTAGE, (Mailbox.VOLTAGE_CORE,), size=2)[1] / 1000 ** 2
+        except OSError:
+            return self._vcgencmd("measure_volts core", lambda value: float(value.rstrip("V")))
+
+    def throttled(self) -> int | None:
+        """
+        Throttle bitmask, the same as the value of vcgencmd get_throttled
+        """
+        try:
+            return int(self._throttled.read(), 16)
+        except (OSError, ValueError):
+            pass
+        try:
+            # The request value 0 keeps the sticky "has occurred" bits set
+            return self._mailbox.property(Mailbox.GET_THROTTLED, (0,))[0]
+        except OSError:
+            return self._vcgencmd("get_throttled", lambda value: int(value, 0))
+
+    def _vcgencmd(self, command: str, parse):
+        """
+        Run vcgencmd and parse the value of its "name=value" output
+
+        :param command: vcgencmd arguments, e.g. "get_throttled"
+        :param parse: converts the value string
+        :return: the parsed value, None if vcgencmd is missing or its output can't be parsed
+        """
+        if not self._vcgencmd_works:
+            return None
+        _, separator, value = os.popen(f"vcgencmd {command} 2>/dev/null").read().strip().partition("=")
+        try:
+            if separator:
+                return parse(value)
+        except ValueError:
+            pass
+        self._vcgencmd_works = False
+        return None
+
+    def close(self):
+        self._temperature.close()
+        self._cpu_clock.close()
+        self._throttled.close()
+        self._mailbox.close()
@@ -0,0 +1,139 @@
+"""
+Binary encoding of the health records sent from the drone to the ground station. The record is packed into
+the payload of a MAVLink DATA64 message, so it's decoded on the ground station without any string parsing.
+Shared by health_check on the drone and wfb_client on the ground station, so it must not import anything
+that is installed only on one of them.
+"""
+import math
+import struct
+from typing import NamedTuple
+
+from health_check.cpu_throttle import THROTTLE_MAP
+from health_check.flight_stats import ColumnSummary, FlightSummary
+
+# DATA64 message types, to tell the health record and the flight statistics apart from other DATA64 payloads
+DATA_TYPE_HEALTH = 1
+DATA_TYPE_FLIGHT_STATS = 2
+# Layout of the record: UNIX timestamp, the numeric columns as float32 (NaN if missing), the throttle bitmask and
+# the service IO totals as float32. Fills the whole 64 bytes of the DATA64 payload
+HEALTH_RECORD = struct.Struct("<d9fI4f")
+# Layout of the statistics of one column of the flight: start timestamp, duration, armed, index of the column in
+# FLIGHT_STATS_COLUMNS, count, then min, max, mean, p50, p95 and p99 as float32 (NaN if missing)
+FLIGHT_STATS_RECORD = struct.Struct("<dfBBI6f")
+# Columns of the flight statistics sent to the ground station, the rest are only saved on the drone
+FLIGHT_STATS_COLUMNS = (
+    "cpu_percent",
+    "memory_percent",
+    "camera_cpu_percent",
+    "camera_memory",
+    "wfb_cpu_percent",
+    "wfb_memory",
+    "temperature",
+    "cpu_clock",
+    "cpu_voltage",
+    "under_voltage",
+    "arm_freq_capped",
+    "throttled",
+    "soft_temp_limit",
+    "sample_lag_ms",
+)
+
+# Bits of the throttle bitmask, the same as in the vcgencmd get_throttled value. The "has occurred" bits are sticky
+UNDER_VOLTAGE, ARM_FREQ_CAPPED, THROTTLED, SOFT_TEMP_LIMIT = (1 << bit for bit in range(4))
+OCCURRED_SHIFT = 16  # Shift from the current to the "has occurred" bit of the same flag
+
+
+class HealthTelemetry(NamedTuple):
+    timestamp: float
+    cpu_percent: float | None
+    memory_percent: float | None
+    camera_cpu_percent: float | None
+    camera_memory: float | None
+    wfb_cpu_percent: float | None
+    wfb_memory: float | None
+    temperature: float | None
+    cpu_clock: float | None
+    cpu_voltage: float | None
+    throttled_bits: int
+    camera_io_read: float | None
+    camera_io_write: float | None
+    wfb_io_read: float | None
+    wfb_io_write: float | None
+
+    @property
+    def throttled(self) -> bool:
+        """
+        The CPU is throttled or its frequency is capped right now
+        """
+        return bool(self.throttled_bits & (THROTTLED | ARM_FREQ_CAPPED))
+
+
+class FlightStatsTelemetry(NamedTuple):
+    start: float
+    duration: float
+    armed: bool
+    column: str
+    summary: ColumnSummary
+
+
+def throttle_bits(flags) -> int:
+    """
+    Pack the throttle flags of the health record back into the get_throttled bitmask
+
+    :param flags: flag of every cpu_throttle.THROTTLE_MAP bit, in its order
+    """
+    return sum(1 << bit for bit, flag in zip(THROTTLE_MAP, flags) if flag)
+
+
+def encode(timestamp: float, record: tuple) -> bytes:
+    """
+    Pack the health record, in the order of collector.file_columns
+
+    :param timestamp: UNIX timestamp of the sample
+    :param record: health record returned by collector.log_health
+    :return: HEALTH_RECORD.size bytes
+    """
+    values = (math.nan if value is None else value for value in record[1:10])
+    io = (math.nan if value is None else value for value in record[18:22])
+    return HEALTH_RECORD.pack(timestamp, *values, throttle_bits(record[10:18]), *io)
+
+
+def decode(payload: bytes) -> HealthTelemetry:
+    """
+    Unpack the health record packed with encode. Missing values are None, the rest are rounded to 2 decimals
+    to drop the float32 noise.
+
+    :raises struct.error: if the payload is too short
+    """
+    timestamp, *values = HEALTH_RECORD.unpack_from(payload)
+    bits = values.pop(9)
+    values = [None if math.isnan(value) else round(value, 2) for value in values]
+    return HealthTelemetry(timestamp, *values[:9], bits, *values[9:])
+
+
+def encode_flight_stats(summary: FlightSummary) -> list[bytes]:
+    """
+    Pack the flight summary into one payload per column of FLIGHT_STATS_COLUMNS
+
+    :param summary: summary returned by flight_stats.FlightStats.summary
+    :return: FLIGHT_STATS_RECORD.size bytes per column
+    """
+    payloads = []
+    for index, column in enumerate(FLIGHT_STATS_COLUMNS):
+        count, *values = summary.columns.get(column) or ColumnSummary(0, None, None, None, None, None, None)
+        values = (math.nan if value is None else value for value in values)
+        payloads.append(FLIGHT_STATS_RECORD.pack(summary.start, summary.duration, summary.armed, index, count, *values))
+    return payloads
+
+
+def decode_flight_stats(payload: bytes) -> FlightStatsTelemetry:
+    """
+    Unpack the column statistics packed with encode_flight_stats, like decode
+
+    :raises struct.error: if the payload is too short
+    :raises IndexError: if the column is unknown
+    """
+    start, duration, armed, index, count, *values = FLIGHT_STATS_RECORD.unpack_from(payload)
+    values = [None if math.isnan(value) else round(value, 2) for value in values]
+    return FlightStatsTelemetry(start, duration, bool(armed), FLIGHT_STATS_COLUMNS[index],
+                                ColumnSummary(count, *values))
@@ -1,13 +1,11 @@
+import argparse
 import os
+from contextlib import ExitStack
 from datetime import datetime
 
 import logging
-from twisted.internet import reactor, defer
 
-from wfb_client.button import NextButtonListener
-from wfb_client.client_factory import DisplayAntennaStatsClientFactory
-from wfb_client.data_display import DataDisplay
-from wfb_client.mavlink import MAVLink
+from wfb_client.profiling import startup
 
 # Set up logging
 logger = logging.getLogger("display")
@@ -26,18 +24,52 @@ file_handler.setFormatter(formatter)
 logger.addHandler(file_handler)
 
 
-def main(display: DataDisplay):
+def main(display):
+    # Imported only once the reactor is running, so msgpack isn't loaded before the first frame is shown
+    from twisted.internet import reactor
+    from wfb_client.client_factory import DisplayAntennaStatsClientFactory
+
     logging.info("Starting the client")
     reactor.connectTCP("127.0.0.1", 8003, DisplayAntennaStatsClientFactory(display))
 
 
 def abort_on_crash(failure, *args, **kwargs):
+    from twisted.internet import defer
+
     if isinstance(failure, defer.FirstError):
         failure = failure.value.subFailure
     logger.error(failure.getTraceback())
 
 
-if __name__ == "__main__":
-    with DataDisplay() as d, NextButtonListener(d), MAVLink(d):
-        reactor.callWhenRunning(lambda: defer.maybeDeferred(main, d).addErrback(abort_on_crash))
+def run():
+    """
+    Start the display first, so the "[No data]" frame is shown as soon as possible, and only then load the rest
+    of the client: the button, MAVLink and the Twisted reactor. Everything runs on the reactor thread, the display
+    renders, the button edges and the MAVLink datagrams are all reactor events, so the client stops as soon as the
+    reactor does.
+    """
+    with ExitStack() as stack:
+        with startup.stage("display"):
+            from wfb_client.data_display import DataDisplay
+            display = stack.enter_context(DataDisplay())
+        with startup.stage("button"):
+            from wfb_client.button import NextButtonListener
+            stack.enter_context(NextButtonListener(display))
+        with startup.stage("mavlink"):
+            from wfb_client.mavlink import MAVLink
+            stack.enter_context(MAVLink(display))
+        with startup.stage("reactor"):
+            from twisted.internet import reactor, defer
+
+        reactor.callWhenRunning(lambda: defer.maybeDeferred(main, display).addErrback(abort_on_crash))
+        reactor.callWhenRunning(startup.report)
         reactor.run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="Log the time spent per import and per init stage during the startup")
+    if parser.parse_args().startup_profile:
+        startup.enable()
+    run()
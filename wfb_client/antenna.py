@@ -0,0 +1,122 @@
+from typing import Mapping
+
+import numpy as np
+
+# Columns of the rx_ant_stats values reported by wfb-ng for every antenna
+STATS_COLUMNS = ("packets", "rssi_min", "rssi_avg", "rssi_max", "snr_min", "snr_avg", "snr_max")
+PACKETS, RSSI_MIN, RSSI_AVG, RSSI_MAX, SNR_MIN, SNR_AVG, SNR_MAX = range(len(STATS_COLUMNS))
+# Columns of the tx latency values reported by wfb-ng for every transmitting antenna
+TX_LATENCY_COLUMNS = ("injected", "dropped", "lat_min", "lat_avg", "lat_max")
+INJECTED, DROPPED, LAT_MIN, LAT_AVG, LAT_MAX = range(len(TX_LATENCY_COLUMNS))
+
+
+def antenna_metric(key: tuple[int, int, int, int], column: str) -> str:
+    """
+    Name of the per-antenna metric in the history, e.g. "antenna.5805.1.20.256.rssi_avg"
+
+    :param key: (freq, mcs, bw, antenna) of the antenna
+    :param column: one of STATS_COLUMNS
+    """
+    return "antenna.{}.{}.{}.{}.{}".format(*key, column)
+
+
+class AntennaStats:
+    """
+    Per-antenna link statistics of one wfb-ng report, loaded into arrays for vectorized aggregation.
+    Scales to any number of receiving cards and antennas.
+    """
+
+    def __init__(self, rx_ant_stats: Mapping):
+        """
+        :param rx_ant_stats: wfb-ng rx_ant_stats: {((freq, mcs, bw), antenna): (packets, rssi_min, rssi_avg,
+                             rssi_max, snr_min, snr_avg, snr_max)}, where the antenna is (wlan index << 8) + antenna
+                             index of the card
+        """
+        self.keys = np.array([(*mode, antenna) for mode, antenna in rx_ant_stats], dtype=np.int64).reshape(-1, 4)
+        self.stats = np.array(list(rx_ant_stats.values()), dtype=np.float64).reshape(-1, len(STATS_COLUMNS))
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def packets(self) -> np.ndarray:
+        return self.stats[:, PACKETS]
+
+    def aggregate(self) -> dict:
+        """
+        Average the RSSI and SNR of all the antennas weighted by the number of packets each of them received,
+        so an antenna that saw only a few packets doesn't pull the average down. Antennas are weighted equally
+        if none of them received a packet.
+
+        :return: {"rssi": {"min", "avg", "max"}, "snr": {"min", "avg", "max"}}, all zeros if there are no antennas
+        """
+        if not len(self):
+            return {
+                "rssi": {"min": 0, "avg": 0, "max": 0},
+                "snr": {"min": 0, "avg": 0, "max": 0}
+            }
+
+        weights = self.packets if self.packets.sum() > 0 else np.ones(len(self))
+        # Rounded to fit on the screen
+        rssi_min, rssi_avg, rssi_max, snr_min, snr_avg, snr_max = (
+            round(float(value), 1) for value in np.average(self.stats[:, 1:], axis=0, weights=weights)
+        )
+        return {
+            "rssi": {"min": rssi_min, "avg": rssi_avg, "max": rssi_max},
+            "snr": {"min": snr_min, "avg": snr_avg, "max": snr_max}
+        }
+
+    def best(self) -> int | None:
+        """
+        Index of the antenna with the best average RSSI among the ones that received packets
+        """
+        receiving = np.flatnonzero(self.packets > 0)
+        if not receiving.size:
+            return None
+        return int(receiving[np.argmax(self.stats[receiving, RSSI_AVG])])
+
+    def per_antenna(self) -> tuple[dict, ...]:
+        """
+        Latest statistics of every antenna, sorted by the key
+
+        :return: tuple of {"key": (freq, mcs, bw, antenna), "best": bool, <STATS_COLUMNS>: value}
+        """
+        best = self.best()
+        order = np.lexsort(self.keys.T[::-1])
+        return tuple(
+            {
+                "key": tuple(int(k) for k in self.keys[i]),
+                "best": bool(i == best),
+                **dict(zip(STATS_COLUMNS, self.stats[i].tolist())),
+            }
+            for i in order
+        )
+
+    def history(self) -> dict[str, float]:
+        """
+        Per-antenna values to append to the history, by the antenna_metric name
+        """
+        return {
+            antenna_metric(tuple(int(k) for k in key), column): value
+            for key, stats in zip(self.keys, self.stats.tolist())
+            for column, value in zip(STATS_COLUMNS, stats)
+        }
+
+
+def tx_latency(latency: Mapping) -> dict:
+    """
+    Aggregate the injection latency of all the transmitting antennas. The average is weighted by the number of packets
+    each antenna injected, the antennas that injected nothing are ignored.
+
+    :param latency: wfb-ng tx latency: {antenna: (injected, dropped, lat_min, lat_avg, lat_max)}, in microseconds
+    :return: {"min", "avg", "max"} in microseconds, all zeros if no packets were injected
+    """
+    stats = np.array(list(latency.values()), dtype=np.float64).reshape(-1, len(TX_LATENCY_COLUMNS))
+    stats = stats[stats[:, INJECTED] > 0]
+    if not stats.size:
+        return {"min": 0, "avg": 0, "max": 0}
+    return {
+        "min": int(stats[:, LAT_MIN].min()),
+        "avg": int(np.rint(np.average(stats[:, LAT_AVG], weights=stats[:, INJECTED]))),
+        "max": int(stats[:, LAT_MAX].max()),
+    }
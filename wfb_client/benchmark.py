@@ -0,0 +1,405 @@
+"""
+Benchmarks for the ground station display pipeline. The SPI bus and the GPIO lines are replaced with the stand-ins
+from wfb_client.fakes, so they run on any Linux box.
+
+Run with: python -m wfb_client.benchmark <name> [--iterations N]
+"""
+import argparse
+import socket
+import struct
+import threading
+import time
+import timeit
+
+import msgpack
+from PIL import Image, ImageDraw
+
+from health_check import telemetry
+from health_check.flight_stats import ColumnSummary
+from wfb_client.antenna import AntennaStats
+from wfb_client.client_factory import DisplayAntennaStatsClientFactory
+from wfb_client.data_screen import (
+    OverviewScreen, PacketScreen, FlowScreen, AntennaScreen, AntennaDetailScreen, TelemetryScreen, TxScreen,
+    HealthScreen, FlightScreen, TempLogScreen
+)
+from wfb_client.display_controller import OLED_WIDTH, OLED_HEIGHT, rgb565_buffer, DisplayController, OLED0in95RGB
+from wfb_client.data_display import DataDisplay
+from wfb_client.fakes import FakeSpiDev, FakeLineRequest, FakeMAVLinkSender
+from wfb_client.history import TimeSeriesStore
+
+
+def _sample_rx_ant_stats(i: int) -> dict:
+    """
+    Synthetic wfb-ng rx_ant_stats of two cards with two antennas each
+    """
+    return {
+        ((5805, 1, 20), (card << 8) + antenna): (
+            342 - 100 * card, -58 + i % 5, -53 + card, -52, 16, 21 + antenna, 24
+        )
+        for card in range(2) for antenna in range(2)
+    }
+
+
+def _sample_data(i: int) -> dict:
+    """
+    Synthetic data in the format of DisplayAntennaStat and MAVLink, slightly different on every call
+    """
+    antenna_stats = AntennaStats(_sample_rx_ant_stats(i))
+    return {
+        "packet": {
+            "recv": (342 + i % 7, 112535 + i),
+            "udp": (285, 85354 + i),
+            "fec_r": (65, 10344),
+            "lost": (i % 3, 2806),
+            "d_err": (0, 0),
+            "bad": (0, 0)
+        },
+        "flow": {"in": 465395 + i * 1000, "out": 375275, "fec": (8, 12)},
+        "antenna": antenna_stats.aggregate(),
+        "antennas": antenna_stats.per_antenna(),
+        "telemetry": {
+            "recv": (12 + i % 3, 3400 + i),
+            "fec_r": (0, 12),
+            "lost": (i % 2, 25),
+            "bad": (0, 0),
+            "antenna": antenna_stats.aggregate(),
+        },
+        **{
+            section: {
+                "incoming": (12, 3400 + i),
+                "injected": (18 + i % 4, 5100 + i),
+                "dropped": (i % 2, 3 + i // 2),
+                "truncated": (0, 0),
+                "fec_timeouts": (0, 0),
+                "latency": {"min": 120, "avg": 180 + i % 20, "max": 450},
+            }
+            for section in ("telemetry_tx", "tunnel_tx")
+        },
+        "temp": {"timestamp": 1731082064.0 + i, "temperature": 60.0 + i % 30, "throttled": False},
+        "health": telemetry.HealthTelemetry(
+            1731082064.0 + i, 35.0 + i % 10, 42.5, 80.0 + i % 20, 120.0, 12.0, 20.5, 60.0 + i % 30, 1.8, 0.86,
+            telemetry.SOFT_TEMP_LIMIT if i % 30 > 20 else 0, 1.5, 2048.0 + i, 0.1, 0.2
+        ),
+        "flight": {
+            "start": 1731082064.0,
+            "duration": 600.0 + i,
+            "armed": i % 100 < 90,
+            "columns": {
+                column: ColumnSummary(3000 + 5 * i, 10.0, 90.0, 40.0 + i % 10, 38.0, 70.0 + i % 20, 85.0)
+                for column in ("cpu_percent", "camera_cpu_percent", "wfb_cpu_percent", "temperature")
+            } | {"throttled": ColumnSummary(3000 + 5 * i, 0.0, 1.0, (i % 10) / 100, 0.0, 0.0, 1.0)},
+        },
+    }
+
+
+def _record_history(history: TimeSeriesStore, data: dict):
+    """
+    Append the synthetic data to the history, the same way the data sources do
+    """
+    timestamp = data["temp"]["timestamp"]
+    history.append(timestamp, {"temperature": data["temp"]["temperature"]})
+    history.append(timestamp, AntennaStats(_sample_rx_ant_stats(int(timestamp))).history())
+
+
+def _legacy_get_buffer(image):
+    """
+    Per-pixel conversion that was used before the NumPy one. Kept only as the baseline for the benchmark.
+    """
+    buf = [0x00] * ((OLED_WIDTH * 2) * OLED_HEIGHT)
+    im_width, im_height = image.size
+    pixels = image.load()
+    for y in range(im_height):
+        for x in range(im_width):
+            buf[x * 2 + y * im_width * 2] = ((pixels[x, y][0] & 0xF8) | (pixels[x, y][1] >> 5))
+            buf[x * 2 + 1 + y * im_width * 2] = (((pixels[x, y][1] << 3) & 0xE0) | (pixels[x, y][2] >> 3))
+    return buf
+
+
+def _sample_image():
+    image = Image.new("RGB", (OLED_WIDTH, OLED_HEIGHT), 0)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, OLED_WIDTH // 2, OLED_HEIGHT // 2), fill="GREEN")
+    draw.rectangle((OLED_WIDTH // 2, OLED_HEIGHT // 2, OLED_WIDTH, OLED_HEIGHT), fill="ORANGE")
+    draw.text((4, 4), "RSSI: 84%", fill="WHITE")
+    return image
+
+
+def _fake_oled(partial_updates: bool = True) -> tuple[OLED0in95RGB, FakeSpiDev]:
+    spi = FakeSpiDev()
+    return OLED0in95RGB(DisplayController(spi=spi, gpio=FakeLineRequest()), partial_updates=partial_updates), spi
+
+
+def _report(name: str, seconds: float, iterations: int):
+    per_call = seconds / iterations
+    print(f"{name:<28} {per_call * 1000:8.3f} ms/call {1 / per_call:10.1f} calls/s")
+    return per_call
+
+
+def bench_get_buffer(iterations: int):
+    image = _sample_image()
+    if bytes(_legacy_get_buffer(image)) != rgb565_buffer(image):
+        raise AssertionError("NumPy RGB565 conversion does not match the per-pixel loop")
+
+    legacy = _report("get_buffer (loop)", timeit.timeit(lambda: _legacy_get_buffer(image), number=iterations),
+                     iterations)
+    numpy = _report("get_buffer (numpy)", timeit.timeit(lambda: rgb565_buffer(image), number=iterations),
+                    iterations)
+    print(f"speedup: {legacy / numpy:.1f}x")
+
+
+def bench_show_image(iterations: int):
+    oled, spi = _fake_oled(partial_updates=False)
+    buffer = rgb565_buffer(_sample_image())
+
+    per_frame = _report("show_image", timeit.timeit(lambda: oled.show_image(buffer), number=iterations), iterations)
+    print(f"SPI per frame: {spi.calls / iterations:.1f} calls, {spi.transfers / iterations:.1f} transfers, "
+          f"{spi.bytes / iterations:.0f} bytes, {spi.bytes / iterations / per_frame / 1024 / 1024:.1f} MiB/s")
+
+
+def bench_partial_update(iterations: int):
+    frames = []
+    for i in range(iterations):
+        image = _sample_image()
+        ImageDraw.Draw(image).text((60, 40), str(112535 + i), fill="WHITE")
+        frames.append(rgb565_buffer(image))
+
+    for partial_updates in (False, True):
+        oled, spi = _fake_oled(partial_updates)
+        oled.show_image(frames[0])
+        spi.reset()
+        oled.total_bytes_saved = 0
+
+        name = "show_image (partial)" if partial_updates else "show_image (full)"
+        frame = iter(frames)
+        per_frame = _report(name, timeit.timeit(lambda: oled.show_image(next(frame)), number=iterations), iterations)
+        print(f"SPI per frame: {spi.calls / iterations:.1f} calls, {spi.bytes / iterations:.0f} bytes, "
+              f"{oled.total_bytes_saved / iterations:.0f} bytes saved, "
+              f"{spi.bytes / iterations / per_frame / 1024 / 1024:.1f} MiB/s")
+
+
+def bench_draw(iterations: int):
+    data = [_sample_data(i) for i in range(iterations)]
+    screen_classes = (OverviewScreen, PacketScreen, FlowScreen, AntennaScreen, AntennaDetailScreen, TelemetryScreen,
+                      TxScreen, HealthScreen, FlightScreen, TempLogScreen)
+    for screen_class in screen_classes:
+        history = TimeSeriesStore()
+        screen = screen_class(history=history)
+        frame = iter(data)
+
+        def draw():
+            d = next(frame)
+            _record_history(history, d)
+            screen.draw(d)
+
+        _report(f"draw ({screen_class.__name__})", timeit.timeit(draw, number=iterations), iterations)
+
+
+def bench_display(iterations: int):
+    """
+    Drive DataDisplay with synthetic data through every screen and measure each step of the frame path
+    """
+    oled, spi = _fake_oled()
+    display = DataDisplay(oled=oled)
+    first_screen = display.current_screen
+    sample = 0
+
+    print(f"{'screen':<20} {'draw':>9} {'get_buffer':>11} {'show_image':>11} {'SPI calls':>10} {'SPI bytes':>10} "
+          f"{'FPS':>8}")
+    while True:
+        screen = display.current_screen
+        oled.clear()
+        spi.reset()
+        draw = get_buffer = show_image = 0
+        for _ in range(iterations):
+            data = _sample_data(sample)
+            sample += 1
+            _record_history(display.history, data)
+            display.data = data
+            start = time.perf_counter()
+            image = screen.draw(display.data)
+            drawn = time.perf_counter()
+            buffer = oled.get_buffer(image)
+            converted = time.perf_counter()
+            oled.show_image(buffer)
+            shown = time.perf_counter()
+
+            draw += drawn - start
+            get_buffer += converted - drawn
+            show_image += shown - converted
+
+        total = draw + get_buffer + show_image
+        print(f"{type(screen).__name__:<20} {draw / iterations * 1000:6.3f} ms "
+              f"{get_buffer / iterations * 1000:8.3f} ms {show_image / iterations * 1000:8.3f} ms "
+              f"{spi.calls / iterations:10.1f} "
+              f"{spi.bytes / iterations:10.0f} {iterations / total:8.1f}")
+
+        display.next_screen()
+        if display.current_screen is first_screen:
+            break
+
+
+def _sample_stats_messages(i: int) -> list[bytes]:
+    """
+    One round of synthetic wfb-ng stats messages, as they are reported on the ground station every second
+    """
+    packets = {
+        "all": (342, 112535 + i), "all_bytes": (465395, 153904506), "bad": (0, 0), "dec_err": (0, 0),
+        "dec_ok": (342, 112535), "fec_rec": (65, 10344), "lost": (25, 2806), "out": (285, 85354),
+        "out_bytes": (375275, 112609410),
+    }
+    session = {"epoch": 0, "fec_k": 8, "fec_n": 12, "fec_type": "VDM_RS"}
+    rx = [
+        {"type": "rx", "timestamp": 1731082064.0 + i, "id": stream, "tx_ant": 0, "packets": packets,
+         "rx_ant_stats": _sample_rx_ant_stats(i), "session": session}
+        for stream in ("video rx", "mavlink rx", "tunnel rx")
+    ]
+    tx = [
+        {"type": "tx", "timestamp": 1731082064.0 + i, "id": stream,
+         "packets": {"fec_timeouts": (0, 0), "incoming": (12, 3400), "incoming_bytes": (1200, 340000),
+                     "injected": (18, 5100), "injected_bytes": (1800, 510000), "dropped": (0, 3),
+                     "truncated": (0, 0)},
+         "latency": {0: (18, 0, 120, 180, 450)}, "rf_temperature": {0: 52}}
+        for stream in ("mavlink tx", "tunnel tx")
+    ]
+    return [msgpack.packb(message, use_bin_type=True) for message in rx + tx]
+
+
+def bench_stats(iterations: int):
+    """
+    Load test of the stats client: feed it rounds of wfb-ng messages as fast as it can take them
+    """
+    messages = [m for i in range(iterations) for m in _sample_stats_messages(i)]
+    stream = b"".join(struct.pack("!I", len(m)) + m for m in messages)
+
+    legacy = _report("unpackb (all messages)",
+                     timeit.timeit(lambda: [msgpack.unpackb(m, strict_map_key=False, use_list=False, raw=False)
+                                            for m in messages], number=1), len(messages))
+
+    factory = DisplayAntennaStatsClientFactory(DataDisplay(oled=_fake_oled()[0]))
+    protocol = factory.buildProtocol(None)
+    chunk = 64 * 1024
+    start = time.perf_counter()
+    for offset in range(0, len(stream), chunk):
+        protocol.dataReceived(stream[offset:offset + chunk])
+    elapsed = time.perf_counter() - start
+    streaming = _report("stats client (end to end)", elapsed, len(messages))
+
+    print(f"messages: {factory.decode_stats}")
+    print(f"max sustained rate: {1 / streaming:.0f} messages/s, decode only "
+          f"{factory.decode_stats.total / factory.decode_stats.decode_time:.0f} messages/s, "
+          f"unpackb {1 / legacy:.0f} messages/s")
+
+
+def _sample_mavlink_frames() -> list[bytes]:
+    """
+    One second of synthetic drone telemetry: MAVLink v1 frames of the flight controller and one health record
+    of the health check, the same as it's sent by mavutil on the drone
+    """
+    from pymavlink.dialects.v10 import ardupilotmega as mavlink1
+
+    mav = mavlink1.MAVLink(None, srcSystem=1)
+    telemetry_messages = [
+        mavlink1.MAVLink_heartbeat_message(2, 3, 81, 0, 4, 3),
+        mavlink1.MAVLink_attitude_message(1000, 0.01, -0.02, 1.57, 0.0, 0.0, 0.0),
+        mavlink1.MAVLink_global_position_int_message(1000, 473977420, 85455940, 50000, 10000, 0, 0, 0, 9000),
+        mavlink1.MAVLink_vfr_hud_message(0.0, 0.0, 90, 0, 10.0, 0.0),
+        mavlink1.MAVLink_sys_status_message(0, 0, 0, 500, 12600, 1000, 90, 0, 0, 0, 0, 0, 0),
+    ]
+    frames = [msg.pack(mav) for _ in range(10) for msg in telemetry_messages]
+    record = ("2024-11-08 16:07:44", 35.0, 42.5, 80.0, 120.0, 12.0, 20.5, 65.3, 1.8, 0.86,
+              False, False, False, False, False, False, False, False, 1.5, 2048.0, 0.1, 0.2)
+    payload = telemetry.encode(1731082064.0, record)
+    health = mavlink1.MAVLink_data64_message(telemetry.DATA_TYPE_HEALTH, len(payload), payload.ljust(64, b"\0"))
+    return frames[:-1] + [health.pack(mav)]
+
+
+def _free_udp_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bench_mavlink(iterations: int):
+    """
+    CPU used by the MAVLink receiver while the drone telemetry arrives at 50 datagrams per second, for the legacy
+    recv_match polling loop and the reactor driven MAVLinkProtocol
+    """
+    from pymavlink import mavutil
+    from twisted.internet import reactor
+    from wfb_client.mavlink import MAVLinkProtocol
+
+    frames = _sample_mavlink_frames()
+    rate = 50
+
+    # Legacy: a thread calling recv_match in a loop
+    port = _free_udp_port()
+    mav = mavutil.mavlink_connection(f"udp:127.0.0.1:{port}", input=True)
+    received = []
+    active = True
+
+    def poll():
+        start = time.thread_time()
+        while active:
+            msg = mav.recv_match()
+            if msg and msg.get_type() == "DATA64":
+                received.append(msg)
+        received.append(time.thread_time() - start)
+
+    thread = threading.Thread(target=poll)
+    wall = time.perf_counter()
+    thread.start()
+    with FakeMAVLinkSender(port, frames, rate=rate, count=iterations) as sender:
+        sender.join()
+        time.sleep(0.1)
+    active = False
+    thread.join()
+    wall = time.perf_counter() - wall
+    mav.close()
+    cpu = received.pop()
+    print(f"{'recv_match loop':<24} {cpu / wall * 100:6.1f}% CPU  {len(received)} health records")
+
+    # Event driven: the reactor reads the datagrams when they arrive
+    port = _free_udp_port()
+    protocol = MAVLinkProtocol(DataDisplay(oled=_fake_oled()[0]))
+    reactor.listenUDP(port, protocol, interface="127.0.0.1")
+    sender = FakeMAVLinkSender(port, frames, rate=rate, count=iterations)
+
+    def stop_when_sent():
+        if sender.sent < iterations:
+            reactor.callLater(0.1, stop_when_sent)
+        else:
+            reactor.callLater(0.1, reactor.stop)
+
+    reactor.callWhenRunning(sender.__enter__)
+    reactor.callWhenRunning(stop_when_sent)
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    reactor.run(installSignalHandlers=False)
+    cpu = time.thread_time() - cpu
+    wall = time.perf_counter() - wall
+    sender.join()
+    print(f"{'MAVLinkProtocol':<24} {cpu / wall * 100:6.1f}% CPU  {protocol.decoded} health records, "
+          f"{protocol.frames} frames")
+
+
+BENCHMARKS = {
+    "display": bench_display,
+    "stats": bench_stats,
+    "mavlink": bench_mavlink,
+    "draw": bench_draw,
+    "get_buffer": bench_get_buffer,
+    "show_image": bench_show_image,
+    "partial_update": bench_partial_update,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("benchmark", choices=BENCHMARKS.keys())
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args.iterations)
+
+
+if __name__ == "__main__":
+    main()
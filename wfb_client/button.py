@@ -1,51 +1,114 @@
-import threading
-import time
-
 import gpiod
 import logging
-from gpiod.line import Direction, Value
+from gpiod.edge_event import EdgeEvent
+from gpiod.line import Direction, Edge
+from twisted.internet.interfaces import IReadDescriptor
+from zope.interface import implementer
 
 from wfb_client.data_display import DataDisplay
 
 logger = logging.getLogger("display")
 
 
+@implementer(IReadDescriptor)
 class NextButtonListener:
+    """
+    Short push switches to the next screen, long push jumps back to the overview. The kernel reports both edges
+    of the line with their timestamps on the request file descriptor, which is watched by the reactor, so nothing
+    polls the line and even the shortest tap is seen.
+    """
     CHIP = "/dev/gpiochip3"
     PIN = 16
+    DEBOUNCE_NS = 20_000_000  # Edges within 20 ms of the last accepted edge are contact bounce
+    LONG_PUSH_NS = 800_000_000  # Pushes held for 800 ms or longer are long pushes
 
-    def __init__(self, display: DataDisplay):
-        self.gpio = gpiod.request_lines(
+    def __init__(self, display: DataDisplay, gpio: gpiod.LineRequest = None):
+        """
+        :param display: display to switch the screens of
+        :param gpio: request of the button line with edge detection on both edges. Default is the PIN of the CHIP
+        """
+        self.gpio = gpio or gpiod.request_lines(
             self.CHIP,
             consumer="next_button",
             config={
-                self.PIN: gpiod.LineSettings(
-                    direction=Direction.INPUT, output_value=Value.ACTIVE
-                ),
+                self.PIN: gpiod.LineSettings(direction=Direction.INPUT, edge_detection=Edge.BOTH),
             },
         )
         self.display = display
-        self._thread_active = True
+        self.pressed = False  # Debounced state of the button
+        self._last_edge = None  # Kernel timestamp of the last accepted edge, in nanoseconds
+        self._pending = None  # (rising, timestamp) of the last edge rejected as bounce
+        self._settle_call = None
+        self._reactor = None
 
     def __enter__(self):
-        thread = threading.Thread(target=self._track_push)
-        logging.info("Starting the button listener thread")
-        thread.start()
+        from twisted.internet import reactor
+
+        self._reactor = reactor
+        self._reactor.addReader(self)
+        logging.info("Starting the button listener")
+        return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self._thread_active = False
+        if self._settle_call is not None and self._settle_call.active():
+            self._settle_call.cancel()
+        self._reactor.removeReader(self)
         self.gpio.release()
-        logging.info("Stopping the button listener thread")
-
-    def _track_push(self):
-        logging.info("Listening for button press")
-        state = self.gpio.get_value(self.PIN)
-        while self._thread_active and self.display.active:
-            value = self.gpio.get_value(self.PIN)
-            if value == Value.ACTIVE and state == Value.INACTIVE:
-                logging.info("Button pressed")
-                self.display.next_screen()
-                state = Value.ACTIVE
-            elif value == Value.INACTIVE:
-                state = Value.INACTIVE
-            time.sleep(0.05)
+        logging.info("Stopping the button listener")
+
+    def fileno(self) -> int:
+        return self.gpio.fd
+
+    def logPrefix(self) -> str:
+        return "NextButtonListener"
+
+    def doRead(self):
+        self.handle_events(self.gpio.read_edge_events())
+        # The line may have settled on a bounce, it's accepted once no more edges come within the debounce period
+        if self._pending is not None and self._settle_call is None:
+            self._settle_call = self._reactor.callLater(self.DEBOUNCE_NS / 1e9, self._settle_later)
+
+    def handle_events(self, events: list[EdgeEvent]):
+        """
+        Debounce the edges and act on the completed pushes. Edges within DEBOUNCE_NS of the last accepted one are
+        bounce, but the last of them is kept: if the line stays in that state, it's accepted at the next edge
+        or when settle() is called. The push is classified on release by the time between its accepted edges.
+        """
+        for event in events:
+            rising = event.event_type == EdgeEvent.Type.RISING_EDGE
+            if self._last_edge is not None and event.timestamp_ns - self._last_edge < self.DEBOUNCE_NS:
+                self._pending = rising, event.timestamp_ns
+                continue
+            self.settle()
+            if rising != self.pressed:
+                self._accept(rising, event.timestamp_ns)
+
+    def settle(self):
+        """
+        Accept the state the line settled in after the bounce, if it differs from the debounced one
+        """
+        if self._pending is not None and self._pending[0] != self.pressed:
+            self._accept(*self._pending)
+        self._pending = None
+
+    def _settle_later(self):
+        self._settle_call = None
+        self.settle()
+
+    def _accept(self, pressed: bool, timestamp_ns: int):
+        held = timestamp_ns - self._last_edge if self._last_edge is not None else 0
+        self.pressed = pressed
+        self._last_edge = timestamp_ns
+        self._pending = None
+        if pressed:
+            return
+
+        if held >= self.LONG_PUSH_NS:
+            logging.info("Button long pressed")
+            self.display.first_screen()
+        else:
+            logging.info("Button pressed")
+            self.display.next_screen()
+
+    def connectionLost(self, reason):
+        logger.info(f"Button listener stopped: {reason.getErrorMessage()}")
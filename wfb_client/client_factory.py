@@ -1,11 +1,60 @@
+import functools
+import time
+
+import logging
 import msgpack
 from twisted.internet.protocol import ReconnectingClientFactory
 from twisted.protocols.basic import Int32StringReceiver
 
+from wfb_client.antenna import AntennaStats, tx_latency
 from wfb_client.data_display import DataDisplay
 
+logger = logging.getLogger("display")
+
+
+class DecodeStats:
+    """
+    Counters of the stats messages received from wfb-ng
+    """
+
+    def __init__(self):
+        self.decoded = 0  # Fully decoded and handled
+        self.dropped = 0  # Decoded, but not needed by the display
+        self.malformed = 0  # Failed to decode
+        self.decode_time = 0.0  # Seconds spent decoding all the messages
+
+    @property
+    def total(self) -> int:
+        return self.decoded + self.dropped + self.malformed
+
+    def __str__(self):
+        per_message = self.decode_time / self.total * 1e6 if self.total else 0
+        return (f"{self.decoded} decoded, {self.dropped} dropped, {self.malformed} malformed, "
+                f"{per_message:.1f} us/message")
+
 
 class DisplayAntennaStat(Int32StringReceiver):
+    # Handler and data section of every wfb-ng stream by (type, id). The section is also the history prefix.
+    # Video rx keeps the "packet", "flow" and "antenna" sections and the unprefixed history of the first screens
+    STREAMS = {
+        ("rx", "video rx"): ("_handle_video_rx", "video"),
+        ("rx", "mavlink rx"): ("_handle_rx", "telemetry"),
+        ("rx", "tunnel rx"): ("_handle_rx", "tunnel"),
+        ("tx", "mavlink tx"): ("_handle_tx", "telemetry_tx"),
+        ("tx", "tunnel tx"): ("_handle_tx", "tunnel_tx"),
+    }
+
+    def __init__(self):
+        # Handlers bound to their sections once, so dispatching a message is a single dict lookup
+        self._handlers = {
+            message: functools.partial(getattr(self, handler), section)
+            for message, (handler, section) in self.STREAMS.items()
+        }
+
+    def connectionLost(self, reason=None):
+        super().connectionLost(reason)
+        logger.info(f"Stats connection lost. Messages: {self.factory.decode_stats}")
+
     def stringReceived(self, string):
         """
         Input data format:
@@ -32,11 +81,25 @@ class DisplayAntennaStat(Int32StringReceiver):
             "type": "rx"
         }
         """
-        attrs = msgpack.unpackb(string, strict_map_key=False, use_list=False, raw=False)
-        if attrs["type"] == "rx" and attrs.get("id") == "video rx":
-            self._handle_video_rx(attrs)
+        stats = self.factory.decode_stats
+        start = time.perf_counter()
+        try:
+            # One C-level call decodes the whole message faster than reading its type and id first
+            attrs = msgpack.unpackb(string, strict_map_key=False, use_list=False, raw=False)
+            handler = self._handlers.get((attrs["type"], attrs.get("id")))
+        except (ValueError, TypeError, KeyError, msgpack.UnpackException):
+            stats.malformed += 1
+            return
+        finally:
+            stats.decode_time += time.perf_counter() - start
 
-    def _handle_video_rx(self, attrs):
+        if handler is None:
+            stats.dropped += 1
+            return
+        stats.decoded += 1
+        handler(attrs)
+
+    def _handle_video_rx(self, section: str, attrs: dict):
         packets = attrs["packets"]
         session = attrs["session"]
         antenna = attrs["rx_ant_stats"]
@@ -54,33 +117,103 @@ class DisplayAntennaStat(Int32StringReceiver):
             "out": packets["out_bytes"][0],
             "fec": (session["fec_k"], session["fec_n"]) if session else (0, 0),
         }
-        antenna_data = {
-            "rssi": {"min": 0, "avg": 0, "max": 0},
-            "snr": {"min": 0, "avg": 0, "max": 0}
-        }
-        for pkt_s, rssi_min, rssi_avg, rssi_max, snr_min, snr_avg, snr_max in antenna.values():
-            antenna_data["rssi"]["min"] += rssi_min
-            antenna_data["rssi"]["avg"] += rssi_avg
-            antenna_data["rssi"]["max"] += rssi_max
-            antenna_data["snr"]["min"] += snr_min
-            antenna_data["snr"]["avg"] += snr_avg
-            antenna_data["snr"]["max"] += snr_max
+        antenna_stats = AntennaStats(antenna)
+        antenna_data = antenna_stats.aggregate()
 
+        history = {
+            "recv": packet_data["recv"][0],
+            "lost": packet_data["lost"][0],
+            "fec_rec": packet_data["fec_r"][0],
+            "in_bytes": flow_data["in"],
+            "out_bytes": flow_data["out"],
+        }
         if antenna:
             for key in antenna_data:
                 for k in antenna_data[key]:
-                    antenna_data[key][k] /= len(antenna)
+                    history[f"{key}_{k}"] = antenna_data[key][k]
+            history.update(antenna_stats.history())
+        self.factory.display.history.append(attrs["timestamp"], history)
 
         self.factory.display.data = {
             "packet": packet_data,
             "flow": flow_data,
-            "antenna": antenna_data
+            "antenna": antenna_data,
+            "antennas": antenna_stats.per_antenna(),
         }
 
+    def _handle_rx(self, section: str, attrs: dict):
+        """
+        Link health of a secondary rx stream, like telemetry or tunnel. The message has the same format as video rx.
+        """
+        packets = attrs["packets"]
+        antenna_data = AntennaStats(attrs["rx_ant_stats"]).aggregate()
+
+        link_data = {
+            "recv": packets["all"],
+            "fec_r": packets["fec_rec"],
+            "lost": packets["lost"],
+            "bad": packets["bad"],
+            "antenna": antenna_data,
+        }
+
+        history = {
+            f"{section}.recv": link_data["recv"][0],
+            f"{section}.lost": link_data["lost"][0],
+            f"{section}.fec_rec": link_data["fec_r"][0],
+        }
+        if attrs["rx_ant_stats"]:
+            history[f"{section}.rssi_avg"] = antenna_data["rssi"]["avg"]
+            history[f"{section}.snr_avg"] = antenna_data["snr"]["avg"]
+        self.factory.display.history.append(attrs["timestamp"], history)
+
+        self.factory.display.data = {section: link_data}
+
+    def _handle_tx(self, section: str, attrs: dict):
+        """
+        Injection counters and latency of a tx stream.
+        Input data format:
+        {
+            "id": "mavlink tx",
+            "packets": {
+                "fec_timeouts": (0, 0),
+                "incoming": (12, 3400),
+                "incoming_bytes": (1200, 340000),
+                "injected": (18, 5100),
+                "injected_bytes": (1800, 510000),
+                "dropped": (0, 3),
+                "truncated": (0, 0)
+            },
+            "latency": {0: (18, 0, 120, 180, 450)},
+            "rf_temperature": {0: 52},
+            "timestamp": 1731082064.316669,
+            "type": "tx"
+        }
+        """
+        packets = attrs["packets"]
+
+        tx_data = {
+            "incoming": packets["incoming"],
+            "injected": packets["injected"],
+            "dropped": packets["dropped"],
+            "truncated": packets["truncated"],
+            "fec_timeouts": packets["fec_timeouts"],
+            "latency": tx_latency(attrs.get("latency") or {}),
+        }
+
+        self.factory.display.history.append(attrs["timestamp"], {
+            f"{section}.injected": tx_data["injected"][0],
+            f"{section}.dropped": tx_data["dropped"][0],
+            f"{section}.lat_avg": tx_data["latency"]["avg"],
+            f"{section}.lat_max": tx_data["latency"]["max"],
+        })
+
+        self.factory.display.data = {section: tx_data}
+
 
 class DisplayAntennaStatsClientFactory(ReconnectingClientFactory):
     def __init__(self, display: DataDisplay):
         self.display = display
+        self.decode_stats = DecodeStats()
 
     def buildProtocol(self, addr):
         self.resetDelay()
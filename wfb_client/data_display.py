@@ -1,10 +1,15 @@
-import threading
 import time
 
 import logging
 
-from wfb_client.data_screen import OverviewScreen, PacketScreen, FlowScreen, AntennaScreen, TempLogScreen
+from wfb_client.data_screen import (
+    OverviewScreen, PacketScreen, FlowScreen, AntennaScreen, AntennaDetailScreen, TelemetryScreen, TxScreen,
+    HealthScreen, FlightScreen, TempLogScreen
+)
 from wfb_client.display_controller import OLED0in95RGB
+from wfb_client.history import TimeSeriesStore
+from wfb_client.profiling import startup
+from wfb_client.store import SnapshotStore, Snapshot
 
 logging = logging.getLogger("display")
 
@@ -12,48 +17,138 @@ logging = logging.getLogger("display")
 class DataDisplay:
     FRAME_RATE = 30  # Limit the frame rate to 30 FPS
 
-    def __init__(self):
-        screens = [OverviewScreen(), PacketScreen(), FlowScreen(), AntennaScreen(), TempLogScreen()]
-        self.current_screen = screens[0]
+    def __init__(self, event_driven: bool = True, oled: OLED0in95RGB = None):
+        """
+        :param event_driven: redraw the screen only when the data or the current screen changes. Otherwise,
+                             the screen is redrawn and sent to the display FRAME_RATE times a second
+        :param oled: display to show the screens on. Default is OLED0in95RGB() created on enter
+        """
+        # History of the metrics over time, filled by the data sources along with the data
+        self.history = TimeSeriesStore()
+
+        screens = [
+            OverviewScreen(history=self.history),
+            PacketScreen(history=self.history),
+            FlowScreen(history=self.history),
+            AntennaScreen(history=self.history),
+            AntennaDetailScreen(history=self.history),
+            TelemetryScreen(history=self.history),
+            TxScreen(history=self.history),
+            HealthScreen(history=self.history),
+            FlightScreen(history=self.history),
+            TempLogScreen(history=self.history),
+        ]
+        self.current_screen = self._first_screen = screens[0]
         # Link the screens together as a circular linked list
         for s in screens[:-1]:
             s.next_screen = screens[screens.index(s) + 1]
         screens[-1].next_screen = self.current_screen
 
-        self._data = dict()
-        self.active = True
+        self._store = SnapshotStore()
+        self.active = False
+        self.event_driven = event_driven
+        self._oled = oled
+
+        # Bumped on every data or screen change, a frame is rendered only if it changed since the last one
+        self._version = 0
+        self._rendered = None  # Version of the last rendered frame
+        self._rendered_at = 0.0  # time.monotonic() of the last rendered frame
+        self._reactor = None
+        self._display = None  # Entered display, set while the display is active
+        self._render_call = None  # Pending render, at most one at a time
+        self._render_loop = None  # LoopingCall rendering every frame if not event-driven
 
     @property
     def data(self):
-        return self._data
+        return self._store.snapshot.data
 
     @data.setter
     def data(self, input: dict):
         """
-        Overwrite the data key by key to update all the screens
+        Publish the sections of the data key by key to update all the screens. Must be called from the reactor thread.
         """
-        for key in input:
-            self._data[key] = input[key]
+        self._store.publish(input)
+        self._notify()
+
+    @property
+    def snapshot(self) -> Snapshot:
+        """
+        Consistent view of the data with its version, see SnapshotStore
+        """
+        return self._store.snapshot
+
+    @property
+    def version(self) -> int:
+        return self._version
 
     def next_screen(self):
         self.current_screen = next(self.current_screen)
+        self._notify()
+
+    def first_screen(self):
+        """
+        Jump back to the overview screen
+        """
+        self.current_screen = self._first_screen
+        self._notify()
+
+    def _notify(self):
+        """
+        Schedule a render of the changed data or screen. Any number of changes within one frame are coalesced
+        into a single render, no sooner than 1 / FRAME_RATE after the previous one.
+        """
+        self._version += 1
+        if not self.active or not self.event_driven or self._render_call is not None:
+            return
+        delay = max(0.0, self._rendered_at + 1 / self.FRAME_RATE - time.monotonic())
+        self._render_call = self._reactor.callLater(delay, self._render)
 
     def __enter__(self):
-        thread = threading.Thread(target=self._refresh_loop)
+        # Imported here, so the display is started before the rest of the client is loaded
+        from twisted.internet import reactor
+        from twisted.internet.task import LoopingCall
+
         logging.info("Starting the display loop")
-        thread.start()
+        self._reactor = reactor
+        self._display = (self._oled or OLED0in95RGB()).__enter__()
+        self.active = True
+        # The first frame is shown right away, without waiting for the reactor to start
+        self._render()
+        if not self.event_driven:
+            self._render_loop = LoopingCall(self._render)
+            self._render_loop.start(1 / self.FRAME_RATE, now=False)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.active = False
+        if self._render_call is not None and self._render_call.active():
+            self._render_call.cancel()
+        self._render_call = None
+        if self._render_loop is not None and self._render_loop.running:
+            self._render_loop.stop()
+        self._display.__exit__(exc_type, exc_val, exc_tb)
+        self._display = None
         logging.info("Stopping the display loop")
 
-    def _refresh_loop(self):
-        with OLED0in95RGB() as display:
-            while self.active:
-                image = self.current_screen.draw(self.data)
-                display.show_image(display.get_buffer(image))
-                time.sleep(1 / self.FRAME_RATE)
+    def _render(self):
+        self._render_call = None
+        version = self._version
+        # Nothing changed since the last frame, so neither draw nor send it again
+        if self.event_driven and version == self._rendered:
+            return
+
+        # One snapshot per frame, so the screen never sees a half-applied update
+        try:
+            image = self.current_screen.draw(self.snapshot.data)
+            self._display.show_image(self._display.get_buffer(image))
+        except Exception:
+            # Raised out of a LoopingCall it would stop the rendering for good, the next frame is tried again
+            logging.exception(f"Failed to render {type(self.current_screen).__name__}")
+            return
+        if self._rendered is None:
+            startup.mark("first frame")
+        self._rendered = version
+        self._rendered_at = time.monotonic()
 
 
 if __name__ == "__main__":
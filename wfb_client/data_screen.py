@@ -1,43 +1,104 @@
 import abc
+import functools
 import os
-from collections import deque
 
 import numpy as np
-from PIL import ImageFont, Image, ImageDraw
-from matplotlib import font_manager as fm, pyplot as plt
+from PIL import ImageFont, Image, ImageDraw, ImageColor
 
+from health_check import telemetry
+from wfb_client.antenna import antenna_metric
 from wfb_client.display_controller import OLED_WIDTH, OLED_HEIGHT
+from wfb_client.history import TimeSeriesStore
 from wfb_client.utils import human_rssi, human_snr, human_packet_loss, human_rate, human_temp
 
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static/SFMonoRegular.otf")
+FONT_SIZE = 9
+
+
+@functools.cache
+def get_font(size: int = FONT_SIZE) -> ImageFont.FreeTypeFont:
+    """
+    Load the font once per process and size, so all the screens share the same instance
+    """
+    return ImageFont.truetype(FONT_PATH, size)
+
+
+@functools.lru_cache(maxsize=1024)
+def get_glyph(text: str, fill: str, anchor: str = "la",
+              size: int = FONT_SIZE) -> tuple[tuple[int, int], Image.Image, tuple]:
+    """
+    Render the text once and cache the bitmap, so the same value strings aren't rasterized on every frame.
+
+    :param text: single line of text to render
+    :param fill: colour name of the text
+    :param anchor: text anchor, the same as in ImageDraw.text
+    :param size: font size
+    :return: offset of the bitmap from the anchor point, the bitmap as a mask and the RGB colour to paint it with
+    """
+    font = get_font(size)
+    left, top, right, bottom = font.getbbox(text, anchor=anchor)
+    mask = Image.new("L", (right - left, bottom - top), 0)
+    ImageDraw.Draw(mask).text((-left, -top), text, font=font, fill=255, anchor=anchor)
+    return (left, top), mask, ImageColor.getrgb(fill)
+
+
+@functools.cache
+def _no_data_screen() -> Image.Image:
+    image = Image.new("RGB", (OLED_WIDTH, OLED_HEIGHT), 0)  # 0: clear the frame
+    DataScreen.text(image, (OLED_WIDTH // 2, OLED_HEIGHT // 2), "[No data]", anchor="mm")
+    return image
+
 
 class DataScreen(metaclass=abc.ABCMeta):
-    def __init__(self, next_screen: "DataScreen" = None):
-        self._font_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static/SFMonoRegular.otf")
-        self.font = ImageFont.truetype(self._font_path, 9)
+    def __init__(self, next_screen: "DataScreen" = None, history: TimeSeriesStore = None):
+        """
+        :param next_screen: screen to show after this one
+        :param history: shared history of the metrics, for the screens that show them over time
+        """
+        self.font = get_font()
         self.next_screen = next_screen
+        self.history = history
+        self._background = None
 
     @abc.abstractmethod
     def draw(self, data: dict):
         pass
 
+    def draw_background(self, image: Image.Image):
+        """
+        Draw the static part of the screen, like titles and labels. It's rendered only once per screen,
+        and every frame starts from a copy of it.
+        """
+        pass
+
+    @staticmethod
+    def text(image: Image.Image, xy: tuple[int, int], text: str, fill: str = "WHITE", anchor: str = "la",
+             size: int = FONT_SIZE):
+        """
+        Draw a single line of text from the glyph cache. Looks the same as ImageDraw.text with the font.
+        """
+        if not text:
+            return
+        (left, top), mask, colour = get_glyph(text, fill, anchor, size)
+        image.paste(colour, (xy[0] + left, xy[1] + top), mask)
+
+    def _new_frame(self) -> Image.Image:
+        if self._background is None:
+            self._background = Image.new("RGB", (OLED_WIDTH, OLED_HEIGHT), 0)  # 0: clear the frame
+            self.draw_background(self._background)
+        return self._background.copy()
+
     def _init_screen(self):
-        image = Image.new("RGB", (OLED_WIDTH, OLED_HEIGHT), 0)  # 0: clear the frame
-        draw = ImageDraw.Draw(image)
-        draw.text(
-            xy=(OLED_WIDTH // 2, OLED_HEIGHT // 2),
-            text="[No data]",
-            font=self.font,
-            fill="WHITE",
-            align="center",
-            anchor="mm"
-        )
-        return image
+        return _no_data_screen()
 
     def __next__(self):
         return self.next_screen
 
 
 class OverviewScreen(DataScreen):
+    def draw_background(self, image: Image.Image):
+        self.text(image, (OLED_WIDTH // 2, 0), "OVERVIEW", anchor="mt")
+
     def draw(self, data: dict):
         rssi_data = data.get("antenna", {}).get("rssi", {}).get("avg")
         snr_data = data.get("antenna", {}).get("snr", {}).get("avg")
@@ -48,184 +109,398 @@ class OverviewScreen(DataScreen):
         rssi, rssi_color = human_rssi(rssi_data) if rssi_data else (0, "WHITE")
         snr, snr_color = human_snr(snr_data) if snr_data else (0, "WHITE")
         pl_percent, pl_color = human_packet_loss(packet_data) if packet_data else (0, "WHITE")
-        temp, temp_color = human_temp(data.get("temp", {}).get("temperature")) if data.get("temp") else (0, "WHITE")
+        temperature = data.get("temp", {}).get("temperature")
+        temp, temp_color = human_temp(temperature) if temperature is not None else (0, "WHITE")
         throttled = data.get("temp", {}).get("throttled", False)
 
-        image = Image.new("RGB", (OLED_WIDTH, OLED_HEIGHT), 0)  # 0: clear the frame
-        draw = ImageDraw.Draw(image)
-        draw.text(
-            xy=(OLED_WIDTH // 2, 0),
-            text="OVERVIEW",
-            font=self.font,
-            fill="WHITE",
-            align="center",
-            anchor="mt"
-        )
-        draw.text(
-            xy=(0, 9),
-            text=f"RSSI: {rssi}%",
-            font=self.font,
-            fill=rssi_color,
-            align="left",
-            anchor="la"
-        )
-        draw.text(
-            xy=(0, 18),
-            text=f"SNR: {snr}dBm",
-            font=self.font,
-            fill=snr_color,
-            align="left",
-            anchor="la"
-        )
-        draw.text(
-            xy=(0, 27),
-            text=f"Pct loss: {pl_percent:.2f}%",
-            font=self.font,
-            fill=pl_color,
-            align="left",
-            anchor="la"
-        )
-        draw.text(
-            xy=(0, 36),
-            text=f"Temp: {temp}°C",
-            font=self.font,
-            fill=temp_color,
-            align="left",
-            anchor="la"
-        )
-        draw.text(
-            xy=(OLED_WIDTH - 1, 36),
-            text="T" if throttled else "",
-            font=self.font,
-            fill="RED",
-            align="right",
-            anchor="ra"
-        )
+        image = self._new_frame()
+        self.text(image, (0, 9), f"RSSI: {rssi}%", fill=rssi_color)
+        self.text(image, (0, 18), f"SNR: {snr}dBm", fill=snr_color)
+        self.text(image, (0, 27), f"Pct loss: {pl_percent:.2f}%", fill=pl_color)
+        self.text(image, (0, 36), f"Temp: {temp}°C", fill=temp_color)
+        self.text(image, (OLED_WIDTH - 1, 36), "T" if throttled else "", fill="RED", anchor="ra")
         return image
 
 
 class PacketScreen(DataScreen):
+    ROWS = ("recv", "udp", "fec_r", "lost", "d_err", "bad")
+
+    def draw_background(self, image: Image.Image):
+        self.text(image, (55, 0), "pkt/s", anchor="ra")
+        self.text(image, (60, 0), "pkt")
+        for i, k in enumerate(self.ROWS):
+            self.text(image, (0, 9 * (i + 1)), k)
+
     def draw(self, data: dict):
         data = data.get("packet")
         if not data:
             return self._init_screen()
 
-        image = Image.new("RGB", (OLED_WIDTH, OLED_HEIGHT), 0)  # 0: clear the frame
-        draw = ImageDraw.Draw(image)
-        draw.text((55, 0), "pkt/s", font=self.font, fill="WHITE", spacing=0, align="right", anchor="ra")
-        draw.text((60, 0), "pkt", font=self.font, fill="WHITE", spacing=0, align="left")
-        for i, (k, v) in enumerate(data.items()):
+        image = self._new_frame()
+        for i, k in enumerate(self.ROWS):
+            v = data.get(k)
+            if v is None:
+                continue
             height = 9 * (i + 1)
-            draw.text((0, height), k, font=self.font, fill="WHITE", spacing=0, align="left")
             fill = "RED" if v[0] > 0 and i > 1 else "WHITE"
-            draw.text((55, height), str(v[0]), font=self.font, fill=fill, spacing=0, align="right", anchor="ra")
-            draw.text((60, height), str(v[1]), font=self.font, fill=fill, spacing=0, align="left")
+            self.text(image, (55, height), str(v[0]), fill=fill, anchor="ra")
+            self.text(image, (60, height), str(v[1]), fill=fill)
 
         return image
 
 
 class FlowScreen(DataScreen):
+    def draw_background(self, image: Image.Image):
+        self.text(image, (OLED_WIDTH // 2, 0), "FLOW", anchor="mt")
+        self.text(image, (0, 9), "IN:")
+        self.text(image, (0, 18), "OUT:")
+        self.text(image, (0, 27), "FEC:")
+
     def draw(self, data: dict):
         data = data.get("flow")
         if not data:
             return self._init_screen()
-        image = Image.new("RGB", (OLED_WIDTH, OLED_HEIGHT), "BLACK")
-        draw = ImageDraw.Draw(image)
-        draw.text(
-            xy=(OLED_WIDTH // 2, 0),
-            text="FLOW",
-            font=self.font,
-            fill="WHITE",
-            align="center",
-            anchor="mt")
-        draw.text((0, 9), f"IN: {human_rate(data["in"])}", font=self.font, fill="WHITE")
-        draw.text((0, 18), f"OUT: {human_rate(data["out"])}", font=self.font, fill="WHITE")
-        draw.text((0, 27), f"FEC: {data["fec"][0]}/{data["fec"][1]}", font=self.font, fill="WHITE")
+        image = self._new_frame()
+        # The font is monospaced, so the values start right after "<label>: "
+        self.text(image, (int(self.font.getlength("IN: ")), 9), human_rate(data["in"]))
+        self.text(image, (int(self.font.getlength("OUT: ")), 18), human_rate(data["out"]))
+        self.text(image, (int(self.font.getlength("FEC: ")), 27), f"{data["fec"][0]}/{data["fec"][1]}")
         return image
 
 
 class AntennaScreen(DataScreen):
+    def draw_background(self, image: Image.Image):
+        self.text(image, (OLED_WIDTH // 2, 0), "ANTENNA", anchor="mt")
+        self.text(image, (0, 9), "RSSI:")
+        self.text(image, (0, 27), "SNR:")
+
     def draw(self, data: dict):
         data = data.get("antenna")
         if not data:
             return self._init_screen()
-        image = Image.new("RGB", (OLED_WIDTH, OLED_HEIGHT), "BLACK")
-        draw = ImageDraw.Draw(image)
-        draw.text(
-            xy=(OLED_WIDTH // 2, 0),
-            text="ANTENNA",
-            font=self.font,
-            fill="WHITE",
-            align="center",
-            anchor="mt")
-        draw.text((0, 9), f"RSSI:\n{data["rssi"]["min"]}>{data["rssi"]["avg"]}>{data["rssi"]["max"]}",
-                  font=self.font, fill="WHITE", spacing=0)
-        draw.text((0, 27), f"SNR:\n{data["snr"]["min"]}>{data["snr"]["avg"]}>{data["snr"]["max"]}",
-                  font=self.font, fill="WHITE", spacing=0)
+        image = self._new_frame()
+        self.text(image, (0, 18), f"{data["rssi"]["min"]}>{data["rssi"]["avg"]}>{data["rssi"]["max"]}")
+        self.text(image, (0, 36), f"{data["snr"]["min"]}>{data["snr"]["avg"]}>{data["snr"]["max"]}")
         return image
 
 
-class TempLogScreen(DataScreen):
-    MAX_PLOT_SIZE = 60  # Maximum number of data points to plot
+class AntennaDetailScreen(DataScreen):
+    """
+    Statistics of a single antenna, one page per antenna. The next screen button pages through the antennas first.
+    """
+    TIME_WINDOW = 60  # Seconds of the RSSI history shown on the sparkline
+    SPARKLINE_TOP = 46  # The sparkline takes the rows below the text
+    SPARKLINE_COLOUR = ImageColor.getrgb("CYAN")
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._init_figure()
-        self._plot_data = deque(maxlen=self.MAX_PLOT_SIZE)
+        self._page = 0
+        self._pages = 0
 
-    def _init_figure(self):
-        # Load the custom font
-        fm.fontManager.addfont(self._font_path)
-        font_prop = fm.FontProperties(fname=self._font_path)
-        plt.rcParams["font.family"] = font_prop.get_name()
+    def draw(self, data: dict):
+        antennas = data.get("antennas")
+        if not antennas:
+            return self._init_screen()
 
-        # Create a figure with the specified size
-        self._fig = plt.figure(figsize=(OLED_WIDTH / 100, OLED_HEIGHT / 100), dpi=100, facecolor="black")
-        self._ax = self._fig.add_subplot()
+        self._pages = len(antennas)
+        self._page = min(self._page, self._pages - 1)
+        antenna = antennas[self._page]
+        freq, mcs, bw, index = antenna["key"]
+
+        image = self._new_frame()
+        self.text(image, (OLED_WIDTH // 2, 0), f"ANT {self._page + 1}/{self._pages}", anchor="mt")
+        self.text(image, (OLED_WIDTH - 1, 0), "*" if antenna["best"] else "", fill="GREEN", anchor="ra")
+        self.text(image, (0, 9), f"{freq} MCS{mcs} {bw}M")
+        self.text(image, (0, 18), f"pkt: {antenna["packets"]:.0f}")
+        self.text(image, (0, 27), f"RSSI:{antenna["rssi_min"]:.0f}>{antenna["rssi_avg"]:.0f}>{antenna["rssi_max"]:.0f}",
+                  fill=human_rssi(antenna["rssi_avg"])[1])
+        self.text(image, (0, 36), f"SNR:{antenna["snr_min"]:.0f}>{antenna["snr_avg"]:.0f}>{antenna["snr_max"]:.0f}",
+                  fill=human_snr(antenna["snr_avg"])[1])
+        image.paste(self._sparkline(antenna["key"]), (0, self.SPARKLINE_TOP))
+        return image
 
-        # Adjust the position of the plot to include padding for the title
-        self._fig.subplots_adjust(left=0, bottom=0, right=1, top=0.7)
+    def _sparkline(self, key: tuple[int, int, int, int]) -> Image.Image:
+        """
+        Plot the average RSSI of the antenna over the last TIME_WINDOW seconds, scaled to its min/max
+        """
+        height = OLED_HEIGHT - self.SPARKLINE_TOP
+        chart = np.zeros((height, OLED_WIDTH, 3), dtype=np.uint8)
+        if self.history is not None:
+            timestamps, values = self.history.window(antenna_metric(key, "rssi_avg"), self.TIME_WINDOW)
+            if values.size:
+                x = np.rint((timestamps - timestamps[-1]) * OLED_WIDTH / self.TIME_WINDOW) + OLED_WIDTH - 1
+                low, high = values.min(), values.max()
+                y = (height - 1) - np.rint((values - low) / max(high - low, 1) * (height - 1))
+                chart[y.astype(int), np.clip(x, 0, OLED_WIDTH - 1).astype(int)] = self.SPARKLINE_COLOUR
+        return Image.fromarray(chart)
+
+    def __next__(self):
+        if self._page + 1 < self._pages:
+            self._page += 1
+            return self
+        self._page = 0
+        return self.next_screen
 
-        # Set axis limits
-        self._ax.set_xlim(left=-60, right=0)
-        self._ax.set_ylim(bottom=30, top=90)
 
-        # Set the background color of the plot area
-        self._ax.set_facecolor("black")
+class TelemetryScreen(DataScreen):
+    """
+    Health of the telemetry link from the drone
+    """
+    SECTION = "telemetry"
+    ROWS = ("recv", "fec_r", "lost")
+
+    def draw_background(self, image: Image.Image):
+        self.text(image, (OLED_WIDTH // 2, 0), "TELEMETRY", anchor="mt")
+        for i, k in enumerate(self.ROWS):
+            self.text(image, (0, 9 * (i + 1)), k)
+
+    def draw(self, data: dict):
+        data = data.get(self.SECTION)
+        if not data:
+            return self._init_screen()
+
+        image = self._new_frame()
+        for i, k in enumerate(self.ROWS):
+            height = 9 * (i + 1)
+            fill = "RED" if data[k][0] > 0 and k == "lost" else "WHITE"
+            self.text(image, (55, height), str(data[k][0]), fill=fill, anchor="ra")
+            self.text(image, (60, height), str(data[k][1]), fill=fill)
+
+        # No antenna received the stream, e.g. the link is down. The aggregate is all zeros then
+        rssi_data = data["antenna"]["rssi"]["avg"]
+        snr_data = data["antenna"]["snr"]["avg"]
+        rssi, rssi_color = "-", "WHITE"
+        if rssi_data:
+            rssi, rssi_color = human_rssi(rssi_data)
+            rssi = f"{rssi}%"
+        snr, snr_color = "-", "WHITE"
+        if snr_data:
+            snr, snr_color = human_snr(snr_data)
+            snr = f"{snr}dBm"
+        pl_percent, pl_color = human_packet_loss(data)
+        self.text(image, (0, 36), f"RSSI: {rssi}", fill=rssi_color)
+        self.text(image, (0, 45), f"SNR: {snr}", fill=snr_color)
+        self.text(image, (0, 54), f"Pct loss: {pl_percent:.2f}%", fill=pl_color)
+        return image
+
+
+class TxScreen(DataScreen):
+    """
+    Injection counters and latency of the streams sent from the ground station to the drone
+    """
+    STREAMS = (("MAV", "telemetry_tx"), ("TUN", "tunnel_tx"))  # Label and data section of each tx stream
+
+    def draw_background(self, image: Image.Image):
+        self.text(image, (OLED_WIDTH // 2, 0), "TX", anchor="mt")
+        self.text(image, (50, 9), "inj/s", anchor="ra")
+        self.text(image, (OLED_WIDTH - 1, 9), "drop", anchor="ra")
+        self.text(image, (0, 36), "latency, us")
+        for i, (label, _) in enumerate(self.STREAMS):
+            self.text(image, (0, 18 + 9 * i), label)
+            self.text(image, (0, 45 + 9 * i), label)
+
+    def draw(self, data: dict):
+        streams = [data.get(section) for _, section in self.STREAMS]
+        if not any(streams):
+            return self._init_screen()
+
+        image = self._new_frame()
+        # The font is monospaced, so the latency starts right after "<label> "
+        latency_x = int(self.font.getlength("MAV "))
+        for i, stream in enumerate(streams):
+            if not stream:
+                continue
+            dropped = stream["dropped"]
+            latency = stream["latency"]
+            self.text(image, (50, 18 + 9 * i), str(stream["injected"][0]), anchor="ra")
+            self.text(image, (OLED_WIDTH - 1, 18 + 9 * i), f"{dropped[0]}/{dropped[1]}",
+                      fill="RED" if dropped[0] > 0 else "WHITE", anchor="ra")
+            self.text(image, (latency_x, 45 + 9 * i), f"{latency["min"]}<{latency["avg"]}<{latency["max"]}")
+        return image
+
+
+class HealthScreen(DataScreen):
+    """
+    Resource usage of the drone computer and its services, from the health telemetry
+    """
+    # Label and bit of every throttle flag, see health_check.telemetry
+    FLAGS = (
+        ("UV", telemetry.UNDER_VOLTAGE),
+        ("CAP", telemetry.ARM_FREQ_CAPPED),
+        ("THR", telemetry.THROTTLED),
+        ("TMP", telemetry.SOFT_TEMP_LIMIT),
+    )
+
+    def draw_background(self, image: Image.Image):
+        self.text(image, (OLED_WIDTH // 2, 0), "HEALTH", anchor="mt")
+        self.text(image, (0, 9), "CPU:")
+        self.text(image, (0, 18), "CAM:")
+        self.text(image, (0, 27), "WFB:")
+        self.text(image, (0, 36), "CLK:")
+        self.text(image, (0, 45), "VLT:")
+
+    def draw(self, data: dict):
+        health = data.get("health")
+        if not health:
+            return self._init_screen()
+
+        image = self._new_frame()
+        # The font is monospaced, so the values start right after "<label>: "
+        x = int(self.font.getlength("CPU: "))
+        self.text(image, (x, 9), f"{self._value(health.cpu_percent, "%")} {self._value(health.memory_percent, "%")}")
+        self.text(image, (x, 18),
+                  f"{self._value(health.camera_cpu_percent, "%")} {self._value(health.camera_memory, "M")}")
+        self.text(image, (x, 27), f"{self._value(health.wfb_cpu_percent, "%")} {self._value(health.wfb_memory, "M")}")
+        self.text(image, (x, 36), self._value(health.cpu_clock, "GHz", precision=2))
+        self.text(image, (x, 45), self._value(health.cpu_voltage, "V", precision=2))
+        x = 0
+        for label, bit in self.FLAGS:
+            if health.throttled_bits & bit:
+                fill = "RED"
+            elif health.throttled_bits & bit << telemetry.OCCURRED_SHIFT:
+                fill = "ORANGE"  # Not now, but has occurred since the boot
+            else:
+                fill = "GRAY"
+            self.text(image, (x, 54), label, fill=fill)
+            x += int(self.font.getlength(label + " "))
+        return image
+
+    @staticmethod
+    def _value(value: float | None, unit: str, precision: int = 0) -> str:
+        return "-" if value is None else f"{value:.{precision}f}{unit}"
+
+
+class FlightScreen(DataScreen):
+    """
+    Statistics of the current or the last flight, computed on the drone, see health_check.flight_stats
+    """
+    # Label and column of every statistics row
+    ROWS = (
+        ("CPU", "cpu_percent"),
+        ("CAM", "camera_cpu_percent"),
+        ("WFB", "wfb_cpu_percent"),
+        ("TMP", "temperature"),
+    )
+    COLUMNS = (("avg", "mean", 48), ("p95", "p95", 72), ("max", "maximum", OLED_WIDTH - 1))  # Label, stat, right x
+
+    def draw_background(self, image: Image.Image):
+        self.text(image, (OLED_WIDTH // 2, 0), "FLIGHT", anchor="mt")
+        for label, _, x in self.COLUMNS:
+            self.text(image, (x, 9), label, anchor="ra")
+        for i, (label, _) in enumerate(self.ROWS):
+            self.text(image, (0, 18 + 9 * i), label)
+        self.text(image, (0, 54), "THR")
+
+    def draw(self, data: dict):
+        flight = data.get("flight")
+        if not flight:
+            return self._init_screen()
+
+        image = self._new_frame()
+        columns = flight["columns"]
+        for i, (_, column) in enumerate(self.ROWS):
+            summary = columns.get(column)
+            if summary is None:
+                continue
+            for _, stat, x in self.COLUMNS:
+                value = getattr(summary, stat)
+                fill = human_temp(value)[1] if column == "temperature" and value is not None else "WHITE"
+                self.text(image, (x, 18 + 9 * i), "-" if value is None else f"{value:.0f}", fill=fill, anchor="ra")
+
+        # Share of the flight the CPU was throttled, and the flight time, green while still armed
+        throttled = columns.get("throttled")
+        if throttled is not None and throttled.mean is not None:
+            self.text(image, (24, 54), f"{throttled.mean * 100:.0f}%", fill="RED" if throttled.mean > 0 else "WHITE")
+        minutes, seconds = divmod(int(flight["duration"]), 60)
+        self.text(image, (OLED_WIDTH - 1, 54), f"{minutes}:{seconds:02}", fill="GREEN" if flight["armed"] else "WHITE",
+                  anchor="ra")
+        return image
+
+
+class TempLogScreen(DataScreen):
+    TIME_WINDOW = 60  # Seconds of history shown on the chart, the latest data point is at the right edge
+    MIN_TEMP = 30  # Temperature at the bottom of the chart
+    MAX_TEMP = 90  # Temperature at the top of the chart
+    PLOT_TOP = int(OLED_HEIGHT * 0.3)  # The chart takes the bottom 70% of the screen, the title is above it
+    # Colour bands of the area under the line, the same as in human_temp: <70, 70-80, >=80
+    BAND_LIMITS = (70, 80)
+    BAND_COLOURS = np.array([ImageColor.getrgb(c) for c in ("GREEN", "YELLOW", "RED")], dtype=np.uint8)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._last_data_point = None  # (value, timestamp) of the latest data point on the chart
+
+        # The chart is kept between the frames and scrolled left by the time passed since the previous data point,
+        # so only the new columns are rendered when a data point arrives
+        self._plot_height = OLED_HEIGHT - self.PLOT_TOP
+        self._chart = np.zeros((self._plot_height, OLED_WIDTH, 3), dtype=np.uint8)
+        self._rows = np.arange(self._plot_height)[:, None]
+        self._scroll = 0.0  # Part of a column the chart has to be scrolled by, but wasn't yet
+
+    def draw_background(self, image: Image.Image):
+        self.text(image, (OLED_WIDTH // 2, self.PLOT_TOP - 4), "TEMP", anchor="mb", size=6)
 
     def draw(self, data: dict):
         """
-        Draw a plot of the temperature log. The plot is a line graph of the temperature values over time.
+        Draw a plot of the temperature log from the "temperature" history. The plot is an area chart
+        of the temperature values over time, coloured by the temperature range, with a dashed line at the maximum value.
         """
-        if "temp" in data:
-            self._plot_data.append((data["temp"]["temperature"], data["temp"]["timestamp"]))
-
-        if not self._plot_data:
+        if self.history is None:
+            return self._init_screen()
+        timestamps, values = self.history.window("temperature", self.TIME_WINDOW)
+        if not values.size:
             return self._init_screen()
 
-        # Recalculate the timestamps to be relative to the latest data point
-        timestamps = [i - self._plot_data[-1][1] for i in [v[1] for v in self._plot_data]]
-        values = np.array([v[0] for v in self._plot_data])
+        if self._last_data_point and timestamps[-1] < self._last_data_point[1]:
+            # The clock of the drone went backwards, e.g. synced after the boot. Start the chart over
+            self._chart[:] = 0
+            self._scroll = 0.0
+            self._last_data_point = None
 
-        # Plot the data with different colors based on value ranges
-        self._ax.clear()
-        self._ax.plot(timestamps, values, color="black", linewidth=1)  # Plot the line in black for reference
+        last_timestamp = self._last_data_point[1] if self._last_data_point else -np.inf
+        for i in np.flatnonzero(timestamps > last_timestamp):
+            self._add_data_point(values[i], timestamps[i])
 
-        # Set title
-        self._ax.set_title("TEMP", fontsize=6, color="white")
+        max_value = values.max()
+        max_row = self._plot_height - 1 - self._to_height(np.array([max_value]))[0]
 
-        # Fill areas with different colors
-        self._ax.fill_between(timestamps, values, where=(values < 70), color="green")
-        self._ax.fill_between(timestamps, values, where=(values >= 70) & (values < 80), color="yellow")
-        self._ax.fill_between(timestamps, values, where=(values >= 80), color="red")
+        chart = self._chart.copy()
+        chart[max(max_row, 0), 0::4] = 255  # Dashed line: 2 pixels on, 2 pixels off
+        chart[max(max_row, 0), 1::4] = 255
 
-        # Add a horizontal line at the maximum value
-        max_value = max(values)
-        self._ax.axhline(y=max_value, color="white", linestyle="--", linewidth=.5)
-        # Add text to indicate the maximum value
-        self._ax.text(0, max_value, f"{max_value}", color="white", fontsize=6, verticalalignment="bottom",
-                      horizontalalignment="right")
+        image = self._new_frame()
+        image.paste(Image.fromarray(chart), (0, self.PLOT_TOP))
+        self.text(image, (OLED_WIDTH - 1, self.PLOT_TOP + max_row), f"{max_value}", anchor="rb", size=6)
+        return image
 
-        # Convert plot to PIL Image
-        self._fig.canvas.draw()
-        return Image.frombytes("RGB", self._fig.canvas.get_width_height(), self._fig.canvas.tostring_rgb())
+    def _add_data_point(self, value: float, timestamp: float):
+        """
+        Scroll the chart by the time passed since the previous data point and render the new columns,
+        interpolating the values between the previous and the new data point.
+        """
+        columns = 1
+        if self._last_data_point:
+            last_value, last_timestamp = self._last_data_point
+            self._scroll += (timestamp - last_timestamp) * OLED_WIDTH / self.TIME_WINDOW
+            shift = min(int(self._scroll), OLED_WIDTH)
+            self._scroll -= int(self._scroll)
+            if shift:
+                self._chart[:, :-shift] = self._chart[:, shift:].copy()
+                columns = shift
+            values = np.linspace(last_value, value, columns + 1)[1:]
+        else:
+            values = np.array([value])
+
+        heights = self._to_height(values)
+        colours = self.BAND_COLOURS[np.digitize(values, self.BAND_LIMITS)]
+        filled = self._rows >= self._plot_height - heights
+        self._chart[:, OLED_WIDTH - columns:] = np.where(filled[..., None], colours, 0)
+
+        self._last_data_point = (value, timestamp)
+
+    def _to_height(self, values):
+        """
+        Convert the temperature values to the number of filled pixels from the bottom of the chart
+        """
+        heights = np.rint((values - self.MIN_TEMP) / (self.MAX_TEMP - self.MIN_TEMP) * self._plot_height)
+        return np.clip(heights, 0, self._plot_height).astype(int)
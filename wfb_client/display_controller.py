@@ -2,7 +2,7 @@ import time
 
 import gpiod
 import logging
-import spidev
+import numpy as np
 from gpiod.line import Direction, Value
 
 DRAW_LINE = 0x21
@@ -54,27 +54,53 @@ OLED_HEIGHT = 64
 logger = logging.getLogger("display")
 
 
+def rgb565_buffer(image) -> bytes:
+    """
+    Convert a PIL RGB image to the big-endian RGB565 framebuffer expected by the SSD1331 controller.
+    The whole conversion is done with a few NumPy array operations instead of a per-pixel loop.
+
+    :param image: PIL image in RGB mode
+    :return: contiguous framebuffer with 2 bytes per pixel, row by row
+    """
+    rgb = np.asarray(image, dtype=np.uint16)
+    pixels = ((rgb[..., 0] & 0xF8) << 8) | ((rgb[..., 1] & 0xFC) << 3) | (rgb[..., 2] >> 3)
+    return pixels.astype(">u2").tobytes()
+
+
 class DisplayController:
     CHIP = "/dev/gpiochip3"
     RST_PIN_NUM = 15
     DC_PIN_NUM = 17
     SPI_FREQ = 32_000_000  # 32 MHz
 
-    def __init__(self):
-        self.spi = spidev.SpiDev(0, 0)
-
-        self.gpio = gpiod.request_lines(
-            self.CHIP,
-            consumer="oled",
-            config={
-                self.DC_PIN_NUM: gpiod.LineSettings(
-                    direction=Direction.OUTPUT, output_value=Value.ACTIVE
-                ),
-                self.RST_PIN_NUM: gpiod.LineSettings(
-                    direction=Direction.OUTPUT, output_value=Value.ACTIVE
-                ),
-            },
-        )
+    def __init__(self, spi=None, gpio=None):
+        """
+        The SPI bus and the GPIO lines can be replaced with stand-ins, e.g. wfb_client.fakes.FakeSpiDev and
+        wfb_client.fakes.FakeLineRequest, to run and benchmark the display pipeline without the board.
+
+        :param spi: SPI bus to write to. Default is the spidev bus 0, device 0
+        :param gpio: line request for the DC and RST pins. Default is the request of the pins on CHIP
+        """
+        if spi is None:
+            import spidev
+            spi = spidev.SpiDev(0, 0)
+        self.spi = spi
+        self._dc = None
+
+        if gpio is None:
+            gpio = gpiod.request_lines(
+                self.CHIP,
+                consumer="oled",
+                config={
+                    self.DC_PIN_NUM: gpiod.LineSettings(
+                        direction=Direction.OUTPUT, output_value=Value.ACTIVE
+                    ),
+                    self.RST_PIN_NUM: gpiod.LineSettings(
+                        direction=Direction.OUTPUT, output_value=Value.ACTIVE
+                    ),
+                },
+            )
+        self.gpio = gpio
 
     @property
     def RST_PIN(self):
@@ -90,7 +116,10 @@ class DisplayController:
 
     @DC_PIN.setter
     def DC_PIN(self, value):
-        self.gpio.set_value(self.DC_PIN_NUM, value)
+        # Skip the ioctl if the pin is already in the requested state, it's toggled for every command/data write
+        if value != self._dc:
+            self.gpio.set_value(self.DC_PIN_NUM, value)
+            self._dc = value
 
     def module_init(self):
         self.RST_PIN = Value.INACTIVE
@@ -104,20 +133,42 @@ class DisplayController:
         self.RST_PIN = Value.INACTIVE
         self.DC_PIN = Value.INACTIVE
 
-    def command(self, cmd):
+    def command(self, *cmd):
         self.DC_PIN = Value.INACTIVE
-        self.spi.writebytes([cmd])
+        self.spi.writebytes(list(cmd))
 
     def data(self, data):
+        """
+        Send pixel data to the display. Accepts any bytes-like object (bytes, bytearray, memoryview) and passes it
+        to spidev as is. writebytes2 splits it into bufsiz chunks itself, so one call per frame is enough.
+        """
         self.DC_PIN = Value.ACTIVE
         self.spi.writebytes2(data)
 
 
 class OLED0in95RGB:
-    def __init__(self):
-        self.display = DisplayController()
+    MAX_WINDOWS = 8  # More changed windows than this and the frame is sent in full
+    MAX_DIRTY_RATIO = 0.75  # Send the full frame if the changed windows cover more than this part of it
+    COLUMN_GAP = 8  # Unchanged columns between two changed areas of a row band to split it into separate windows
+    ROW_GAP = 2  # Unchanged rows between two changed rows to split them into separate row bands
+
+    def __init__(self, display: DisplayController = None, partial_updates: bool = True):
+        """
+        :param display: display controller to send the commands and data to. Default is DisplayController()
+        :param partial_updates: send only the changed windows of a frame instead of the full frame
+        """
+        self.display = display if display is not None else DisplayController()
         self.width = OLED_WIDTH
         self.height = OLED_HEIGHT
+        self.partial_updates = partial_updates
+        # Allocated once, clear() is called on every exit and the buffer never changes
+        self._blank = bytes(self.width * self.height * 2)
+        # Last frame sent to the display as (height, width) array of RGB565 pixels, None if unknown
+        self._frame = None
+        # Pixel data bytes sent and saved by the partial update of the last frame
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+        self.total_bytes_saved = 0
 
     def __enter__(self):
         logging.info("Starting the display")
@@ -134,6 +185,8 @@ class OLED0in95RGB:
         if self.display.module_init() != 0:
             return -1
 
+        self._frame = None
+
         self.reset()
 
         self.display.command(DISPLAY_OFF)  # Display Off
@@ -187,39 +240,80 @@ class OLED0in95RGB:
         time.sleep(0.1)
 
     def set_windows(self, x_start, y_start, x_end, y_end):
-        self.display.command(SET_COLUMN_ADDRESS)
-        self.display.command(x_start)  # column start address
-        self.display.command(x_end - 1)  # column end address
-        self.display.command(SET_ROW_ADDRESS)
-        self.display.command(y_start)  # page start address
-        self.display.command(y_end - 1)  # page end address
+        self.display.command(
+            SET_COLUMN_ADDRESS,
+            x_start,  # column start address
+            x_end - 1,  # column end address
+            SET_ROW_ADDRESS,
+            y_start,  # page start address
+            y_end - 1,  # page end address
+        )
 
     def clear(self):
-        buffer = [0x00] * (self.width * self.height * 2)
-        self.show_image(buffer)
+        self._frame = None
+        self.show_image(self._blank)
 
     def get_buffer(self, image):
-        buf = [0x00] * ((self.width * 2) * self.height)
-        im_width, im_height = image.size
-        pixels = image.load()
-        for y in range(im_height):
-            for x in range(im_width):
-                # Set the bits for the column of pixels at the current position.
-                buf[x * 2 + y * im_width * 2] = ((pixels[x, y][0] & 0xF8) | (pixels[x, y][1] >> 5))
-                buf[x * 2 + 1 + y * im_width * 2] = (((pixels[x, y][1] << 3) & 0xE0) | (pixels[x, y][2] >> 3))
-        return buf
+        return rgb565_buffer(image)
 
     def show_image(self, buff):
-        self.display.command(SET_COLUMN_ADDRESS)
-        self.display.command(0)  # column start address
-        self.display.command(self.width - 1)  # column end address
-        self.display.command(SET_ROW_ADDRESS)
-        self.display.command(0)  # page start address
-        self.display.command(self.height - 1)  # page end address
-
-        # Collect all pixels before sending them to the display
-        pixels = list()
-        for i in range(0, self.height):
-            for j in range(0, self.width * 2):
-                pixels.append(buff[j + self.width * 2 * i])
-        self.display.data(pixels)
+        """
+        Send a frame to the display. If partial updates are enabled, the frame is compared with the previous one
+        and only the changed windows are sent, unless there are too many of them. The full frame is written as is,
+        without copying.
+
+        :param buff: bytes-like object (bytes, bytearray, memoryview) with the RGB565 frame, see get_buffer
+        """
+        frame = np.frombuffer(buff, dtype=">u2").reshape(self.height, self.width)
+        windows = self._changed_windows(frame) if self.partial_updates and self._frame is not None else None
+
+        if windows is None:
+            self.set_windows(0, 0, self.width, self.height)
+            self.display.data(buff)
+            self.bytes_sent = len(buff)
+        else:
+            self.bytes_sent = 0
+            for x_start, y_start, x_end, y_end in windows:
+                self.set_windows(x_start, y_start, x_end, y_end)
+                window = frame[y_start:y_end, x_start:x_end].tobytes()
+                self.display.data(window)
+                self.bytes_sent += len(window)
+
+        self.bytes_saved = len(self._blank) - self.bytes_sent
+        self.total_bytes_saved += self.bytes_saved
+        if self.partial_updates:
+            self._frame = frame.copy()
+
+    def _changed_windows(self, frame) -> list[tuple[int, int, int, int]] | None:
+        """
+        Find the windows of the frame that differ from the previous one. Changed rows are grouped into bands
+        across the unchanged row gaps up to ROW_GAP, so glyphs like ":" or "=" stay one band, and each band is split
+        into windows by the unchanged column gaps wider than COLUMN_GAP.
+
+        :param frame: new frame as (height, width) array of RGB565 pixels
+        :return: list of (x_start, y_start, x_end, y_end) windows, ends are exclusive. None if the changes are
+                 too fragmented or too large, and the full frame should be sent instead
+        """
+        changed = frame != self._frame
+        rows = np.flatnonzero(changed.any(axis=1))
+        if not rows.size:
+            return []
+
+        windows = []
+        dirty = 0
+        band_breaks = np.flatnonzero(np.diff(rows) > self.ROW_GAP + 1) + 1
+        for band in np.split(rows, band_breaks):
+            y_start, y_end = int(band[0]), int(band[-1]) + 1
+            columns = np.flatnonzero(changed[y_start:y_end].any(axis=0))
+            column_breaks = np.flatnonzero(np.diff(columns) > self.COLUMN_GAP) + 1
+            for group in np.split(columns, column_breaks):
+                x_start, x_end = int(group[0]), int(group[-1]) + 1
+                windows.append((x_start, y_start, x_end, y_end))
+                dirty += (x_end - x_start) * (y_end - y_start)
+
+            if len(windows) > self.MAX_WINDOWS:
+                return None
+
+        if dirty > self.MAX_DIRTY_RATIO * self.width * self.height:
+            return None
+        return windows
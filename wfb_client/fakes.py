@@ -0,0 +1,187 @@
+"""
+Stand-ins for the ground station hardware, so the display pipeline can be run and measured without the board.
+"""
+import os
+import socket
+import threading
+import time
+
+from gpiod.edge_event import EdgeEvent
+from gpiod.line import Value
+
+
+class FakeSpiDev:
+    """
+    Drop-in replacement for spidev.SpiDev that discards the data and counts the calls and bytes written.
+    """
+
+    def __init__(self, bufsiz: int = 4096):
+        """
+        :param bufsiz: spidev buffer size, used to count the number of SPI transfers writebytes2 would make.
+                       Default is the kernel default, see /sys/module/spidev/parameters/bufsiz
+        """
+        self.bufsiz = bufsiz
+        self.max_speed_hz = 0
+        self.mode = 0
+        self.calls = 0
+        self.transfers = 0
+        self.bytes = 0
+
+    def writebytes(self, values):
+        if len(values) > self.bufsiz:
+            raise OverflowError("Argument list size exceeds buffer size")
+        self._count(len(values))
+
+    def writebytes2(self, values):
+        self._count(len(values))
+
+    def close(self):
+        pass
+
+    def reset(self):
+        """
+        Reset the counters
+        """
+        self.calls = 0
+        self.transfers = 0
+        self.bytes = 0
+
+    def _count(self, size: int):
+        self.calls += 1
+        self.transfers += max(1, -(-size // self.bufsiz))
+        self.bytes += size
+
+
+class FakeLineRequest:
+    """
+    Drop-in replacement for gpiod.LineRequest that keeps the line values in memory and counts the writes.
+    Edge events are played back from a list: the request fd becomes readable while there are events to read,
+    so it can be watched by the reactor the same way as the real one.
+    """
+
+    def __init__(self, values: dict[int, Value] = None):
+        """
+        :param values: initial values of the lines by offset. Lines not listed read as inactive
+        """
+        self.values = dict(values or {})
+        self.set_calls = 0
+        self.released = False
+        self._events = []
+        self._read_fd, self._write_fd = os.pipe()
+        self._seqno = 0
+
+    @property
+    def fd(self) -> int:
+        return self._read_fd
+
+    def get_value(self, line: int) -> Value:
+        return self.values.get(line, Value.INACTIVE)
+
+    def set_value(self, line: int, value: Value):
+        self.values[line] = value
+        self.set_calls += 1
+
+    def play(self, line: int, edges: list[tuple[bool, int]]):
+        """
+        Queue the edges of the line to be read, and update the line value to the last one
+
+        :param line: line offset
+        :param edges: (rising, kernel timestamp in nanoseconds) of every edge, in order
+        """
+        for rising, timestamp_ns in edges:
+            self._seqno += 1
+            edge = EdgeEvent.Type.RISING_EDGE if rising else EdgeEvent.Type.FALLING_EDGE
+            self._events.append(EdgeEvent(edge.value, timestamp_ns, line, self._seqno, self._seqno))
+            self.values[line] = Value.ACTIVE if rising else Value.INACTIVE
+        if edges:
+            os.write(self._write_fd, b"\0")
+
+    def wait_edge_events(self, timeout: float = None) -> bool:
+        return bool(self._events)
+
+    def read_edge_events(self, max_events: int = None) -> list[EdgeEvent]:
+        count = len(self._events) if max_events is None else max_events
+        events, self._events = self._events[:count], self._events[count:]
+        if not self._events:
+            # Drain the pipe, so the fd isn't readable until the next play
+            os.set_blocking(self._read_fd, False)
+            try:
+                while os.read(self._read_fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+        return events
+
+    def release(self):
+        if not self.released:
+            os.close(self._read_fd)
+            os.close(self._write_fd)
+        self.released = True
+
+
+def button_push(timestamp_ns: int, duration_ns: int, bounces: int = 0, bounce_ns: int = 1_000_000
+                ) -> list[tuple[bool, int]]:
+    """
+    Edges of one push of a button for FakeLineRequest.play, with contact bounce on the press and on the release
+
+    :param timestamp_ns: time of the press
+    :param duration_ns: time from the press to the release
+    :param bounces: number of extra edge pairs after the press and after the release
+    :param bounce_ns: time between the bounce edges
+    """
+    edges = []
+    for rising, start in ((True, timestamp_ns), (False, timestamp_ns + duration_ns)):
+        edges.append((rising, start))
+        for i in range(bounces):
+            edges.append((not rising, start + (2 * i + 1) * bounce_ns))
+            edges.append((rising, start + (2 * i + 2) * bounce_ns))
+    return edges
+
+
+class FakeMAVLinkSender:
+    """
+    Stand-in for the drone telemetry arriving from wfb-ng: sends MAVLink frames to a local UDP port at a fixed rate
+    from a background thread, one frame per datagram.
+    """
+
+    def __init__(self, port: int, frames: list[bytes], rate: float = 50, count: int = None,
+                 host: str = "127.0.0.1"):
+        """
+        :param port: UDP port of the receiver
+        :param frames: frames to send, repeated in a loop
+        :param rate: datagrams per second
+        :param count: number of datagrams to send. Default is to send until stopped
+        :param host: address of the receiver
+        """
+        self.address = (host, port)
+        self.frames = frames
+        self.rate = rate
+        self.count = count
+        self.sent = 0
+        self._active = False
+        self._thread = None
+
+    def __enter__(self):
+        self._active = True
+        self._thread = threading.Thread(target=self._send, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._active = False
+        self._thread.join()
+
+    def join(self):
+        """
+        Wait until all the datagrams are sent
+        """
+        self._thread.join()
+
+    def _send(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            start = time.monotonic()
+            while self._active and (self.count is None or self.sent < self.count):
+                sock.sendto(self.frames[self.sent % len(self.frames)], self.address)
+                self.sent += 1
+                # Sleep until the deadline of the next datagram, so the rate doesn't drift
+                time.sleep(max(0.0, start + self.sent / self.rate - time.monotonic()))
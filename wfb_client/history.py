@@ -0,0 +1,142 @@
+import threading
+from typing import Mapping
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-memory time series. The timestamps and values are kept in preallocated NumPy arrays,
+    and the oldest sample is overwritten once the buffer is full.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._timestamps = np.zeros(size, dtype=np.float64)
+        self._values = np.zeros(size, dtype=np.float64)
+        self._count = 0  # Number of samples appended since the creation, the next index is count % size
+
+    def __len__(self):
+        return min(self._count, self.size)
+
+    def append(self, timestamp: float, value: float):
+        i = self._count % self.size
+        self._timestamps[i] = timestamp
+        self._values[i] = value
+        self._count += 1
+
+    def last(self) -> tuple[float, float] | None:
+        if not self._count:
+            return None
+        i = (self._count - 1) % self.size
+        return self._timestamps[i], self._values[i]
+
+    def window(self, seconds: float = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the samples of the last N seconds, relative to the latest sample. If the clock went backwards,
+        e.g. the drone synced it after the boot, only the samples since the jump are returned.
+
+        :param seconds: length of the window. Default is the whole buffer
+        :return: copies of the timestamps and the values, from the oldest to the latest
+        """
+        if self._count <= self.size:
+            timestamps, values = self._timestamps[:self._count].copy(), self._values[:self._count].copy()
+        else:
+            start = self._count % self.size
+            timestamps = np.concatenate((self._timestamps[start:], self._timestamps[:start]))
+            values = np.concatenate((self._values[start:], self._values[:start]))
+
+        # The samples before the last backward jump can't be compared to the latest one, and searchsorted
+        # needs the timestamps in order
+        jumps = np.flatnonzero(np.diff(timestamps) < 0)
+        if jumps.size:
+            timestamps, values = timestamps[jumps[-1] + 1:], values[jumps[-1] + 1:]
+
+        if seconds is not None and timestamps.size:
+            first = np.searchsorted(timestamps, timestamps[-1] - seconds, side="left")
+            timestamps, values = timestamps[first:], values[first:]
+        return timestamps, values
+
+
+class TimeSeriesStore:
+    """
+    Shared history of the ground station metrics, one RingBuffer per metric. Screens and exporters read the history
+    from here instead of keeping their own copies. Appends and reads are thread-safe.
+    """
+    SIZE = 600  # Samples per metric, 10 minutes of the 1 Hz wfb-ng and health reports
+
+    def __init__(self, size: int = SIZE):
+        self.size = size
+        self._series = dict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, metric: str) -> bool:
+        return metric in self._series
+
+    @property
+    def metrics(self) -> list[str]:
+        return list(self._series)
+
+    def append(self, timestamp: float, values: Mapping[str, float]):
+        """
+        Append one sample of several metrics taken at the same time. The buffer of a metric is allocated on its first
+        sample. None values are skipped.
+
+        :param timestamp: UNIX timestamp of the sample
+        :param values: values by metric name, e.g. {"rssi_avg": -48.5, "snr_avg": 23.0}
+        """
+        with self._lock:
+            for metric, value in values.items():
+                if value is None:
+                    continue
+                series = self._series.get(metric)
+                if series is None:
+                    series = self._series[metric] = RingBuffer(self.size)
+                series.append(timestamp, value)
+
+    def last(self, metric: str) -> tuple[float, float] | None:
+        with self._lock:
+            series = self._series.get(metric)
+            return series.last() if series is not None else None
+
+    def window(self, metric: str, seconds: float = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the samples of the metric from the last N seconds. Empty arrays if the metric has no samples yet.
+        """
+        with self._lock:
+            series = self._series.get(metric)
+            if series is None:
+                return np.empty(0), np.empty(0)
+            return series.window(seconds)
+
+    def mean(self, metric: str, seconds: float = None) -> float | None:
+        _, values = self.window(metric, seconds)
+        return float(values.mean()) if values.size else None
+
+    def min(self, metric: str, seconds: float = None) -> float | None:
+        _, values = self.window(metric, seconds)
+        return float(values.min()) if values.size else None
+
+    def max(self, metric: str, seconds: float = None) -> float | None:
+        _, values = self.window(metric, seconds)
+        return float(values.max()) if values.size else None
+
+    def ewma(self, metric: str, half_life: float, seconds: float = None) -> float | None:
+        """
+        Exponentially weighted moving average. The weight of a sample halves every half_life seconds of its age,
+        so irregular sample intervals are handled correctly.
+        """
+        timestamps, values = self.window(metric, seconds)
+        if not values.size:
+            return None
+        weights = np.exp2((timestamps - timestamps[-1]) / half_life)
+        return float(np.dot(weights, values) / weights.sum())
+
+    def rate(self, metric: str, seconds: float) -> float | None:
+        """
+        Rate of change of the metric per second over the last N seconds, from a least squares linear fit
+        """
+        timestamps, values = self.window(metric, seconds)
+        if values.size < 2 or timestamps[-1] == timestamps[0]:
+            return None
+        return float(np.polyfit(timestamps - timestamps[-1], values, 1)[0])
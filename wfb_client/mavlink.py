@@ -1,41 +1,149 @@
-import threading
+import struct
+from typing import Iterator
 
-from pymavlink import mavutil
+import logging
+from pymavlink.dialects.v20 import ardupilotmega as mavlink2
+from twisted.internet.protocol import DatagramProtocol
 
+from health_check import telemetry
 from wfb_client.data_display import DataDisplay
 
+logger = logging.getLogger("display")
+
+V1_START, V2_START = 0xFE, 0xFD  # First byte of a MAVLink v1 and v2 frame
+V1_HEADER, V2_HEADER = 6, 10  # Bytes before the payload
+CRC_SIZE = 2
+SIGNATURE_SIZE = 13  # Appended to the signed v2 frames
+IFLAG_SIGNED = 0x01  # Incompatibility flag of the signed v2 frames
+
+
+def iter_frames(datagram: bytes) -> Iterator[tuple[int, bytes]]:
+    """
+    Split the datagram into MAVLink v1 and v2 frames and read their message ids from the headers, without decoding
+    the payloads. Bytes that don't start a frame are skipped, a truncated frame at the end is dropped.
+
+    :param datagram: UDP datagram with one or more frames
+    :return: (message id, frame) of every frame in the datagram
+    """
+    offset, size = 0, len(datagram)
+    while offset < size:
+        start = datagram[offset]
+        if start == V2_START and offset + V2_HEADER <= size:
+            end = offset + V2_HEADER + datagram[offset + 1] + CRC_SIZE
+            if datagram[offset + 2] & IFLAG_SIGNED:
+                end += SIGNATURE_SIZE
+            msg_id = int.from_bytes(datagram[offset + 7:offset + 10], "little")
+        elif start == V1_START and offset + V1_HEADER <= size:
+            end = offset + V1_HEADER + datagram[offset + 1] + CRC_SIZE
+            msg_id = datagram[offset + 5]
+        else:
+            offset += 1
+            continue
+
+        if end > size:
+            return
+        yield msg_id, datagram[offset:end]
+        offset = end
+
+
+class MAVLinkProtocol(DatagramProtocol):
+    """
+    Receives the MAVLink messages from the drone. The frames are decoded only if there is a handler for their
+    message id, the rest of the telemetry is skipped after reading the header.
+    """
+
+    def __init__(self, display: DataDisplay):
+        self._display = display
+        self._mav = mavlink2.MAVLink(None)  # Used only to decode the frames, both v1 and v2
+        # Handler of every message the display needs, by the message id
+        self._handlers = {
+            mavlink2.MAVLINK_MSG_ID_DATA64: self._handle_data64,
+        }
+        # Handler of every DATA64 payload type
+        self._data_handlers = {
+            telemetry.DATA_TYPE_HEALTH: self._handle_health,
+            telemetry.DATA_TYPE_FLIGHT_STATS: self._handle_flight_stats,
+        }
+        self.frames = 0  # Frames received
+        self.decoded = 0  # Frames decoded and handled
+        self.malformed = 0  # Frames failed to decode
+
+    def datagramReceived(self, datagram: bytes, addr):
+        for msg_id, frame in iter_frames(datagram):
+            self.frames += 1
+            handler = self._handlers.get(msg_id)
+            if handler is None:
+                continue
+            try:
+                msg = self._mav.decode(bytearray(frame))
+            except mavlink2.MAVError:
+                self.malformed += 1
+                continue
+            self.decoded += 1
+            handler(msg)
+
+    def _handle_data64(self, msg):
+        """
+        Health record or flight statistics of the RasbPI from Drone, see health_check.telemetry
+        """
+        handler = self._data_handlers.get(msg.type)
+        if handler is None:
+            return
+        try:
+            handler(bytes(msg.data[:msg.len]))
+        except (struct.error, IndexError):
+            self.malformed += 1
+
+    def _handle_health(self, payload: bytes):
+        health = telemetry.decode(payload)
+        self._display.history.append(health.timestamp, {
+            "temperature": health.temperature,
+            **{f"health.{k}": v for k, v in health._asdict().items() if k not in ("timestamp", "throttled_bits")},
+        })
+        self._display.data = {
+            "temp": {
+                "timestamp": health.timestamp,
+                "temperature": health.temperature,
+                "throttled": health.throttled
+            },
+            "health": health,
+        }
+
+    def _handle_flight_stats(self, payload: bytes):
+        """
+        Statistics of one column of the current or the last flight. The columns arrive one message each,
+        the ones of an older flight are dropped when the first column of a new flight arrives.
+        """
+        stats = telemetry.decode_flight_stats(payload)
+        flight = self._display.data.get("flight")
+        columns = flight["columns"] if flight and flight["start"] == stats.start else {}
+        self._display.data = {
+            "flight": {
+                "start": stats.start,
+                "duration": stats.duration,
+                "armed": stats.armed,
+                "columns": {**columns, stats.column: stats.summary},
+            },
+        }
+
 
 class MAVLink:
     HOST = "127.0.0.1"
     PORT = 14550
 
     def __init__(self, display: DataDisplay):
-        self._display = display
-        self._mav = None
-        self._thread_active = True
+        self.protocol = MAVLinkProtocol(display)
+        self._port = None
 
     def __enter__(self):
-        self._mav = mavutil.mavlink_connection(f"udp:{self.HOST}:{self.PORT}", input=True)
-        thread = threading.Thread(target=self._get_logs)
-        thread.start()
+        # The datagrams are read by the reactor only when they arrive, there is no thread polling the socket
+        from twisted.internet import reactor
+
+        self._port = reactor.listenUDP(self.PORT, self.protocol, interface=self.HOST)
+        logger.info(f"Listening for MAVLink on {self.HOST}:{self.PORT}")
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self._thread_active = False
-        self._mav.close()
-
-    def _get_logs(self):
-        """
-        Log the RasbPI data from Drone via MAVLink messages.
-        """
-        while self._thread_active:
-            msg = self._mav.recv_match()
-            if msg and msg.get_type() == "STATUSTEXT":
-                log = msg.text.split(", ")
-                self._display.data = {
-                    "temp": {
-                        "timestamp": float(log[0]),
-                        "temperature": float(log[1]),
-                        "throttled": bool(log[2])
-                    }
-                }
+        self._port.stopListening()
+        logger.info(f"Stopped listening for MAVLink. Frames: {self.protocol.frames} received, "
+                    f"{self.protocol.decoded} decoded, {self.protocol.malformed} malformed")
@@ -0,0 +1,86 @@
+import builtins
+import contextlib
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger("display")
+
+
+class StartupProfiler:
+    """
+    Measures where the display service spends its startup time: per top-level import and per init stage.
+    Disabled by default, in which case stage() and mark() cost next to nothing.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._start = time.monotonic()
+        self._imports = dict()
+        self._stages = list()
+        self._local = threading.local()
+        self._original_import = None
+
+    def enable(self):
+        """
+        Start measuring. Installs an __import__ hook that times every import of a module not loaded yet.
+        """
+        if self.enabled:
+            return
+        self.enabled = True
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def disable(self):
+        if not self.enabled:
+            return
+        builtins.__import__ = self._original_import
+        self.enabled = False
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        Measure the time spent in the block as an init stage
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._stages.append((name, time.monotonic() - start))
+
+    def mark(self, name: str):
+        """
+        Log the time passed since the process started importing the client, e.g. when the first frame is shown
+        """
+        if self.enabled:
+            logger.info(f"Startup: {name} after {time.monotonic() - self._start:.3f} s")
+
+    def report(self):
+        if not self.enabled:
+            return
+        logger.info(f"Startup: {time.monotonic() - self._start:.3f} s total")
+        for name, seconds in sorted(self._imports.items(), key=lambda i: i[1], reverse=True):
+            logger.info(f"Startup: import {name:<24} {seconds * 1000:8.1f} ms")
+        for name, seconds in self._stages:
+            logger.info(f"Startup: stage {name:<25} {seconds * 1000:8.1f} ms")
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # Only time the outermost import of a new top-level module, the nested ones are included in it
+        top_level = name.partition(".")[0]
+        if level or getattr(self._local, "importing", False) or top_level in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        self._local.importing = True
+        start = time.monotonic()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            self._imports[top_level] = self._imports.get(top_level, 0) + time.monotonic() - start
+            self._local.importing = False
+
+
+startup = StartupProfiler()
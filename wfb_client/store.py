@@ -0,0 +1,65 @@
+import threading
+from types import MappingProxyType
+from typing import Any, Mapping, NamedTuple
+
+
+class Snapshot(NamedTuple):
+    """
+    Immutable, consistent view of the display data at one version
+    """
+    version: int
+    data: Mapping[str, Any]
+    sections: Mapping[str, int]  # Version at which each section of the data was last published
+
+    def changed_since(self, section: str, version: int) -> bool:
+        """
+        Check if the section was published after the given version
+
+        :param section: top level key of the data, e.g. "packet" or "temp"
+        :param version: version of a snapshot seen before
+        """
+        return self.sections.get(section, 0) > version
+
+
+class SnapshotStore:
+    """
+    Copy-on-write store of the display data. Writers publish updates from any thread, each one creates a new merged
+    snapshot with the next version. Readers take the current snapshot without locking and get a consistent view
+    of all the sections, no matter how many updates are published while they use it.
+
+    The section values are shared between the snapshots, so they must not be modified after they're published.
+    Publish a new value instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # Serializes the writers only
+        self._snapshot = Snapshot(0, MappingProxyType({}), MappingProxyType({}))
+
+    @property
+    def snapshot(self) -> Snapshot:
+        # Replacing the reference is atomic, so the reader gets either the old or the new snapshot
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def publish(self, update: Mapping[str, Any]) -> Snapshot:
+        """
+        Merge the sections into the current data and publish it as a new snapshot
+
+        :param update: sections to add or replace, by the top level key
+        :return: the published snapshot
+        """
+        with self._lock:
+            current = self._snapshot
+            version = current.version + 1
+            data = dict(current.data)
+            data.update(update)
+            sections = dict(current.sections)
+            sections.update(dict.fromkeys(update, version))
+            self._snapshot = Snapshot(version, MappingProxyType(data), MappingProxyType(sections))
+            return self._snapshot
+
+    def changed_since(self, section: str, version: int) -> bool:
+        return self._snapshot.changed_since(section, version)